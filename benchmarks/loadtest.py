@@ -0,0 +1,341 @@
+"""HTTP load test for the MADR API.
+
+Starts the app under uvicorn against a throwaway database, seeds it and
+drives a mixed workload with an asyncio httpx client, then compares the
+per-endpoint numbers against a checked-in baseline:
+
+    python -m benchmarks.loadtest --concurrency 20 --duration 15
+    python -m benchmarks.loadtest --update-baseline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from mader.models import table_registry
+
+BASELINE = Path(__file__).with_name('baseline.json')
+PASSWORD = 'loadtest-password'
+
+# (name, weight) of each operation in the mixed workload
+WORKLOAD = [
+    ('GET /books/', 25),
+    ('GET /books/{id}', 25),
+    ('GET /search/', 10),
+    ('GET /romancists/', 10),
+    ('POST /auth/token', 5),
+    ('POST /books/', 15),
+    ('PATCH /books/{id}', 10),
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--database-url',
+        default='sqlite+aiosqlite:///./loadtest.db',
+        help='database the app under test runs against (recreated)',
+    )
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--romancists', type=int, default=100)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help='allowed relative regression of p95 latency and throughput',
+    )
+    parser.add_argument('--update-baseline', action='store_true')
+    return parser.parse_args(argv)
+
+
+async def reset_database(url: str):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+        await conn.run_sync(table_registry.metadata.create_all)
+    await engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    env = {
+        'SECRET_KEY': 'loadtest-secret-key-that-is-long-enough',
+        'ALGORITHM': 'HS256',
+        'ACCESS_TOKEN_EXPIRE_MINUTES': '30',
+        # every simulated client shares one IP
+        'AUTH_RATE_LIMIT_BURST': '1000000',
+        **os.environ,
+        'DATABASE_URL': args.database_url,
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            '-m',
+            'uvicorn',
+            'mader.app:app',
+            '--host',
+            '127.0.0.1',
+            '--port',
+            str(port),
+            '--workers',
+            str(args.workers),
+            '--log-level',
+            'warning',
+            '--no-access-log',
+        ],
+        env=env,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get('/')).status_code == httpx.codes.OK:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+
+    raise RuntimeError('app did not start in time')
+
+
+async def seed(client: httpx.AsyncClient, args) -> dict:
+    await client.post(
+        '/users/',
+        json={
+            'username': 'loadtest',
+            'email': 'loadtest@mail.com',
+            'password': PASSWORD,
+        },
+    )
+    token = await login(client)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = await client.post(
+        '/romancists/bulk',
+        json=[{'name': f'romancist {n}'} for n in range(args.romancists)],
+        headers=headers,
+    )
+    romancist_ids = [r['id'] for r in response.json()['romancists']]
+
+    book_ids = []
+    for start in range(0, args.books, 1000):
+        response = await client.post(
+            '/books/bulk',
+            json=[
+                {
+                    'title': f'seed book {n}',
+                    'year': 1800 + n % 200,
+                    'romancist_id': random.choice(romancist_ids),
+                }
+                for n in range(start, min(start + 1000, args.books))
+            ],
+            headers=headers,
+        )
+        book_ids += [b['id'] for b in response.json()['books']]
+
+    return {
+        'headers': headers,
+        'romancist_ids': romancist_ids,
+        'book_ids': book_ids,
+    }
+
+
+async def login(client: httpx.AsyncClient) -> str:
+    response = await client.post(
+        '/auth/token',
+        data={'username': 'loadtest@mail.com', 'password': PASSWORD},
+    )
+    return response.json()['access_token']
+
+
+def request_for(operation: str, state: dict, counter: int):
+    book_id = random.choice(state['book_ids'])
+    credentials = {'username': 'loadtest@mail.com', 'password': PASSWORD}
+    new_book = {
+        'title': f'load book {counter}',
+        'year': 1900,
+        'romancist_id': random.choice(state['romancist_ids']),
+    }
+    requests = {
+        'GET /books/': ('GET', '/books/', {'params': {'limit': 20}}),
+        'GET /books/{id}': ('GET', f'/books/{book_id}', {}),
+        'GET /search/': (
+            'GET',
+            '/search/',
+            {'params': {'q': f'book {counter}'}},
+        ),
+        'GET /romancists/': ('GET', '/romancists/', {}),
+        'POST /auth/token': ('POST', '/auth/token', {'data': credentials}),
+        'POST /books/': (
+            'POST',
+            '/books/',
+            {'json': new_book, 'headers': state['headers']},
+        ),
+        'PATCH /books/{id}': (
+            'PATCH',
+            f'/books/{book_id}',
+            {
+                'json': {'year': 1800 + counter % 200},
+                'headers': state['headers'],
+            },
+        ),
+    }
+    return requests[operation]
+
+
+async def run_workload(client: httpx.AsyncClient, state: dict, args):
+    names = [name for name, _ in WORKLOAD]
+    weights = [weight for _, weight in WORKLOAD]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    counter = iter(range(10**9))
+    deadline = time.monotonic() + args.duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            operation = random.choices(names, weights)[0]
+            method, url, options = request_for(operation, state, next(counter))
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **options)
+                failed = response.status_code >= httpx.codes.BAD_REQUEST
+            except httpx.HTTPError:
+                failed = True
+            latencies[operation].append(time.perf_counter() - started)
+            errors[operation] += failed
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.monotonic() - started
+
+    return summarize(latencies, errors, elapsed)
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index] * 1000
+
+
+def summarize(latencies: dict, errors: dict, elapsed: float) -> dict:
+    endpoints = {
+        operation: {
+            'requests': len(samples),
+            'errors': errors[operation],
+            'rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(samples, 0.50), 2),
+            'p95_ms': round(percentile(samples, 0.95), 2),
+            'p99_ms': round(percentile(samples, 0.99), 2),
+        }
+        for operation, samples in sorted(latencies.items())
+    }
+    total = sum(result['requests'] for result in endpoints.values())
+    return {'rps': round(total / elapsed, 1), 'endpoints': endpoints}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for operation, base in baseline['endpoints'].items():
+        current = results['endpoints'].get(operation)
+        if current is None:
+            regressions.append(f'{operation}: no requests recorded')
+            continue
+
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{operation}: p95 {current["p95_ms"]}ms '
+                f'> baseline {base["p95_ms"]}ms'
+            )
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(
+                f'{operation}: {current["rps"]} rps '
+                f'< baseline {base["rps"]} rps'
+            )
+
+    return regressions
+
+
+def report(results: dict):
+    print(
+        f'{"endpoint":<20}{"reqs":>8}{"errs":>6}{"rps":>9}'
+        f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+    )
+    for operation, result in results['endpoints'].items():
+        print(
+            f'{operation:<20}{result["requests"]:>8}{result["errors"]:>6}'
+            f'{result["rps"]:>9}{result["p50_ms"]:>9}'
+            f'{result["p95_ms"]:>9}{result["p99_ms"]:>9}'
+        )
+    print(f'total: {results["rps"]} rps')
+
+
+async def main(args) -> int:
+    await reset_database(args.database_url)
+    port = free_port()
+    server = start_server(args, port)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f'http://127.0.0.1:{port}',
+            timeout=30,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await wait_until_ready(client)
+            state = await seed(client, args)
+            results = await run_workload(client, state, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    results['config'] = {
+        'database': args.database_url.split(':', 1)[0],
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'workers': args.workers,
+        'books': args.books,
+    }
+    report(results)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'baseline written to {args.baseline}')
+        return 0
+
+    if not args.baseline.exists():
+        print('no baseline to compare against')
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get('config') != results['config']:
+        print('warning: baseline was recorded with a different config')
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
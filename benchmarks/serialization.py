@@ -0,0 +1,115 @@
+"""CPU cost of serializing one list page.
+
+Compares the pydantic paths over ORM objects (validate into the response
+model, then dump it, either directly or the way FastAPI renders a
+response_model) with the two paths the list endpoints pick between: the
+default validates the selected rows into the model before dumping them,
+FAST_SERIALIZATION=true dumps the row dicts straight to JSON bytes:
+
+    python -m benchmarks.serialization --sizes 20 100 --rounds 2000
+"""
+
+import argparse
+import json
+import time
+from functools import partial
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from mader.models import Book, Romancist, table_registry
+from mader.schemas import BookPublic, BooksList
+from mader.serialization import (
+    columns_for,
+    fast_json,
+    model_json,
+    rows_as_dicts,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--rounds', type=int, default=2000)
+    return parser.parse_args(argv)
+
+
+def model_dump_json(books) -> bytes:
+    # unset fields, like the optional total, are left out by the fast path
+    return (
+        BooksList.model_validate(
+            {'books': books, 'next_cursor': None}, from_attributes=True
+        )
+        .model_dump_json(exclude_unset=True)
+        .encode()
+    )
+
+
+def response_model(books) -> bytes:
+    # validate, dump to python, then JSONResponse's json.dumps
+    content = BooksList.model_validate(
+        {'books': books, 'next_cursor': None}, from_attributes=True
+    ).model_dump(mode='json')
+    return json.dumps(content, separators=(',', ':')).encode()
+
+
+def validated_path(rows) -> bytes:
+    return model_json(
+        BooksList, {'books': rows_as_dicts(rows), 'next_cursor': None}
+    )
+
+
+def fast_path(rows) -> bytes:
+    return fast_json(
+        BooksList, {'books': rows_as_dicts(rows), 'next_cursor': None}
+    )
+
+
+def cpu_per_call(func, rounds: int) -> float:
+    started = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - started) / rounds * 1_000_000
+
+
+def main(args):
+    engine = create_engine('sqlite://')
+    table_registry.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(Romancist(name='romancist'))
+        session.add_all(
+            Book(title=f'title {n}', year=1900, romancist_id=1)
+            for n in range(max(args.sizes))
+        )
+        session.commit()
+
+        print(
+            f'{"page":>6}{"model_dump_json":>18}{"response_model":>17}'
+            f'{"validated":>12}{"fast":>9}{"speedup":>10}'
+            '   (CPU us per page)'
+        )
+        for size in args.sizes:
+            books = session.scalars(select(Book).limit(size)).all()
+            rows = session.execute(
+                select(*columns_for(Book, BookPublic)).limit(size)
+            ).all()
+            assert fast_path(rows) == model_dump_json(books)
+            assert validated_path(rows) == fast_path(rows)
+
+            dumped = cpu_per_call(partial(model_dump_json, books), args.rounds)
+            rendered = cpu_per_call(
+                partial(response_model, books), args.rounds
+            )
+            validated = cpu_per_call(
+                partial(validated_path, rows), args.rounds
+            )
+            fast = cpu_per_call(partial(fast_path, rows), args.rounds)
+            print(
+                f'{size:>6}{dumped:>18.1f}{rendered:>17.1f}'
+                f'{validated:>12.1f}{fast:>9.1f}{validated / fast:>9.1f}x'
+            )
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,98 @@
+"""Python overhead of building hot statements per request.
+
+Compares a fresh select() per call, as the routers used to do, with the
+pre-built bound-parameter statements in mader.statements, both for cache
+key generation alone and for a full ORM execution against SQLite:
+
+    python -m benchmarks.statements --rounds 20000
+"""
+
+import argparse
+import time
+from functools import partial
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from mader.models import Book, Romancist, User, table_registry
+from mader.statements import BOOK_BY_ID, USER_BY_EMAIL
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    return parser.parse_args(argv)
+
+
+def cpu_per_call(func, rounds: int) -> float:
+    started = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - started) / rounds * 1_000_000
+
+
+def fresh_book_key():
+    return select(Book).where(Book.id == 1)._generate_cache_key()
+
+
+def prebuilt_book_key():
+    return BOOK_BY_ID._generate_cache_key()
+
+
+def fresh_book(session: Session):
+    return session.scalar(select(Book).where(Book.id == 1))
+
+
+def prebuilt_book(session: Session):
+    return session.scalar(BOOK_BY_ID, {'book_id': 1})
+
+
+def fresh_user(session: Session):
+    return session.scalar(select(User).where(User.email == 'user@mail.com'))
+
+
+def prebuilt_user(session: Session):
+    return session.scalar(USER_BY_EMAIL, {'email': 'user@mail.com'})
+
+
+def main(args):
+    engine = create_engine('sqlite://')
+    table_registry.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(Romancist(name='romancist'))
+        session.add(Book(title='title', year=1900, romancist_id=1))
+        session.add(
+            User(username='user', email='user@mail.com', password='secret')
+        )
+        session.commit()
+
+        cases = [
+            ('cache key', fresh_book_key, prebuilt_book_key),
+            (
+                'book by id',
+                partial(fresh_book, session),
+                partial(prebuilt_book, session),
+            ),
+            (
+                'user by email',
+                partial(fresh_user, session),
+                partial(prebuilt_user, session),
+            ),
+        ]
+
+        print(
+            f'{"statement":<16}{"fresh us":>10}{"prebuilt us":>13}'
+            f'{"saved us":>10}'
+        )
+        for name, fresh, prebuilt in cases:
+            fresh_cost = cpu_per_call(fresh, args.rounds)
+            prebuilt_cost = cpu_per_call(prebuilt, args.rounds)
+            print(
+                f'{name:<16}{fresh_cost:>10.1f}{prebuilt_cost:>13.1f}'
+                f'{fresh_cost - prebuilt_cost:>10.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -2,4 +2,6 @@
 
 poetry run alembic upgrade head
 
+# behind a load balancer, set TRUSTED_PROXIES so rate limits see the
+# client addresses in X-Forwarded-For rather than the balancer's
 poetry run opentelemetry-instrument uvicorn mader.app:app --host 0.0.0.0
\ No newline at end of file
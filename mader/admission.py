@@ -0,0 +1,53 @@
+import math
+import time
+from http import HTTPStatus
+from typing import Hashable
+
+from fastapi import HTTPException, Request
+
+from mader.cache import TTLCache
+from mader.settings import get_settings
+
+settings = get_settings()
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: int, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        # an idle bucket is full again after burst / rate seconds, so
+        # dropping it then is the same as keeping it
+        self._buckets = TTLCache(maxsize=maxsize, ttl=burst / rate)
+
+    def take(self, key: Hashable) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) / self.rate
+
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+    def clear(self):
+        self._buckets.clear()
+
+
+auth_buckets = TokenBuckets(
+    rate=settings.AUTH_RATE_LIMIT_PER_SECOND,
+    burst=settings.AUTH_RATE_LIMIT_BURST,
+    maxsize=settings.AUTH_RATE_LIMIT_CLIENTS,
+)
+
+
+def limit_auth_attempts(request: Request):
+    client = request.client.host if request.client else None
+    retry_after = auth_buckets.take(client)
+    if retry_after:
+        raise HTTPException(
+            status_code=HTTPStatus.TOO_MANY_REQUESTS,
+            detail='Too many requests',
+            headers={'Retry-After': str(math.ceil(retry_after))},
+        )
@@ -1,14 +1,72 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
 
-from mader.routers import auth, books, romancists, users
+from fastapi import APIRouter, FastAPI, Request
+from sqlalchemy.ext.asyncio import AsyncEngine
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
-app = FastAPI()
-app.include_router(users.router)
-app.include_router(auth.router)
-app.include_router(romancists.router)
-app.include_router(books.router)
+from mader.budget import query_budget
+from mader.cache import response_cache
+from mader.database import engine as default_engine
+from mader.database import pool_stats, replicas
+from mader.routers import auth, books, imports, romancists, search, users
+from mader.security import password_pool, principal_cache
+from mader.settings import get_settings
+from mader.timing import ServerTimingMiddleware
+from mader.warmup import warm_up
 
+settings = get_settings()
+router = APIRouter()
 
-@app.get('/')
+
+@router.get('/')
+@query_budget(0)
 async def read_root():
     return {'message': 'Hello World!'}
+
+
+@router.get('/metrics')
+@query_budget(0)
+async def read_metrics(request: Request):
+    return {
+        'principal_cache': principal_cache.stats(),
+        'password_pool': password_pool.stats(),
+        'response_cache': response_cache.stats(),
+        'database_pool': pool_stats(request.app.state.engine),
+        'read_replicas': replicas.stats(),
+    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up(app.state.engine, settings.DATABASE_WARMUP_CONNECTIONS)
+    await replicas.check()
+    yield
+    # an engine passed to create_app belongs to the caller
+    if app.state.owns_engine:
+        await app.state.engine.dispose()
+    await replicas.dispose()
+
+
+def create_app(engine: AsyncEngine | None = None) -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.state.engine = engine or default_engine
+    app.state.owns_engine = engine is None
+    app.add_middleware(
+        ServerTimingMiddleware,
+        log_threshold_ms=settings.SERVER_TIMING_LOG_THRESHOLD_MS,
+    )
+    if settings.TRUSTED_PROXIES:
+        app.add_middleware(
+            ProxyHeadersMiddleware, trusted_hosts=settings.TRUSTED_PROXIES
+        )
+    app.include_router(router)
+    app.include_router(users.router)
+    app.include_router(auth.router)
+    app.include_router(romancists.router)
+    app.include_router(books.router)
+    app.include_router(search.router)
+    app.include_router(imports.router)
+    return app
+
+
+app = create_app()
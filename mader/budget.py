@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.routing import Match
+
+# background jobs started by a request run after its response and aren't
+# part of what the request itself costs
+background_work: ContextVar[bool] = ContextVar(
+    'background_work', default=False
+)
+
+
+@contextmanager
+def outside_budget():
+    token = background_work.set(True)
+    try:
+        yield
+    finally:
+        background_work.reset(token)
+
+
+def query_budget(limit: int) -> Callable:
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = limit
+        return endpoint
+
+    return decorator
+
+
+def route_budget(app, method: str, path: str) -> int | None:
+    scope = {'type': 'http', 'method': method, 'path': path, 'root_path': ''}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route.endpoint, 'query_budget', None)
+
+    return None
+
+
+class QueryCounter:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine.sync_engine
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, statement: str, **kw):
+        if not background_work.get():
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(
+            self.engine, 'before_cursor_execute', self._record, named=True
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
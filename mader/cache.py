@@ -0,0 +1,154 @@
+import hashlib
+import time
+from collections import Counter, OrderedDict
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi import Request, Response
+
+from mader.settings import get_settings
+
+settings = get_settings()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = item
+        if expires_at <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        self._data[key] = (value, time.time() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]):
+        for key in [k for k, (v, _) in self._data.items() if predicate(k, v)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+response_cache = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE, ttl=settings.RESPONSE_CACHE_TTL
+)
+# bumped on every invalidation, so a render that raced a write can tell
+# its bytes may predate the write
+response_generations: Counter[str] = Counter()
+# and when, since a replica can take a while to show the write
+response_invalidated_at: dict[str, float] = {}
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+
+    candidates = {
+        tag.strip().removeprefix('W/') for tag in if_none_match.split(',')
+    }
+    return '*' in candidates or etag in candidates
+
+
+def replica_may_lag(namespaces: tuple[str, ...], rendered_at: float) -> bool:
+    # READ_YOUR_WRITES_WINDOW is how long a replica is allowed to lag
+    return any(
+        rendered_at - response_invalidated_at.get(name, float('-inf'))
+        < settings.READ_YOUR_WRITES_WINDOW
+        for name in namespaces
+    )
+
+
+async def cached_response(
+    request: Request,
+    namespaces: str | tuple[str, ...],
+    render: Callable[[], Awaitable[str | bytes]],
+) -> Response:
+    if getattr(request.state, 'read_from_primary', False):
+        # cached pages may come from a replica that hasn't caught up
+        return Response(await render(), media_type='application/json')
+
+    if isinstance(namespaces, str):
+        namespaces = (namespaces,)
+
+    key = (namespaces, request.url.path, request.url.query)
+    entry = response_cache.get(key)
+    if entry is None:
+        generations = [response_generations[name] for name in namespaces]
+        rendered_at = time.monotonic()
+        body = await render()
+        if isinstance(body, str):
+            body = body.encode()
+        entry = (body, make_etag(body))
+        raced = generations != [
+            response_generations[name] for name in namespaces
+        ]
+        lagging = getattr(
+            request.state, 'read_from_replica', False
+        ) and replica_may_lag(namespaces, rendered_at)
+        if not raced and not lagging:
+            response_cache.set(key, entry)
+
+    body, etag = entry
+    if etag_matches(request, etag):
+        return Response(
+            status_code=HTTPStatus.NOT_MODIFIED, headers={'ETag': etag}
+        )
+
+    return Response(
+        body, media_type='application/json', headers={'ETag': etag}
+    )
+
+
+def invalidate_responses(*namespaces: str):
+    response_generations.update(namespaces)
+    now = time.monotonic()
+    for name in namespaces:
+        response_invalidated_at[name] = now
+    response_cache.discard_where(
+        lambda key, _: not set(key[0]).isdisjoint(namespaces)
+    )
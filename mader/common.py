@@ -4,10 +4,11 @@ from fastapi import Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from mader.database import get_session
+from mader.database import get_read_session, get_session
 from mader.models import User
 from mader.security import get_current_user
 
 T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
 T_CurrentUser = Annotated[User, Depends(get_current_user)]
 T_Oauth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
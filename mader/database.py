@@ -1,10 +1,251 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import asyncio
+import itertools
+import time
 
-from mader.settings import Settings
+from fastapi import Request
+from sqlalchemy import event, make_url, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-engine = create_async_engine(Settings().DATABASE_URL)
+from mader.cache import TTLCache
+from mader.settings import Settings, get_settings
+from mader.statements import prepare_on_connect
+from mader.timing import record
 
 
-async def get_session():  # pragma: no cover
-    async with AsyncSession(engine) as session:
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kw):
+        super().__init__(
+            creator, pool_size=pool_size, max_overflow=max_overflow, **kw
+        )
+        self.capacity = pool_size + max_overflow if max_overflow >= 0 else 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            wait = time.perf_counter() - started
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            record('pool', wait)
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            'saturation': (
+                self.checkedout() / self.capacity if self.capacity else 0.0
+            ),
+            'checkouts': self.checkouts,
+            'wait_avg_ms': (
+                self.total_wait / self.checkouts * 1000
+                if self.checkouts
+                else 0.0
+            ),
+            'wait_max_ms': self.max_wait * 1000,
+        }
+
+
+def enforce_foreign_keys(engine: AsyncEngine):
+    # SQLite ignores foreign keys, ON DELETE CASCADE included, unless
+    # every connection asks for them
+    @event.listens_for(engine.sync_engine, 'connect')
+    def foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def build_engine(
+    settings: Settings,
+    url: str | None = None,
+    connect_timeout: int | None = None,
+) -> AsyncEngine:
+    url = make_url(url or settings.DATABASE_URL)
+    options = {'query_cache_size': settings.DATABASE_STATEMENT_CACHE_SIZE}
+    connect_args = {}
+
+    if url.get_backend_name() == 'sqlite' and url.database in {
+        None,
+        '',
+        ':memory:',
+    }:
+        engine = create_async_engine(url, **options)
+        enforce_foreign_keys(engine)
+        return engine
+
+    if url.get_backend_name() == 'postgresql' and settings.DATABASE_PGBOUNCER:
+        # transaction pooling can't keep server-side prepared statements
+        connect_args['prepare_threshold'] = None
+    if url.get_backend_name() == 'postgresql' and connect_timeout:
+        connect_args['connect_timeout'] = connect_timeout
+    if connect_args:
+        options['connect_args'] = connect_args
+
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        **options,
+    )
+    if url.get_backend_name() == 'sqlite':
+        enforce_foreign_keys(engine)
+    elif (
+        url.get_driver_name() == 'psycopg' and not settings.DATABASE_PGBOUNCER
+    ):
+        prepare_on_connect(engine)
+
+    return engine
+
+
+class ReplicaSet:
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        health_interval: float,
+        probe_timeout: float,
+    ):
+        self.engines = engines
+        self.health_interval = health_interval
+        self.probe_timeout = probe_timeout
+        self._turn = itertools.count()
+        self._health: dict[AsyncEngine, tuple[bool, float]] = {}
+        self._probes: dict[AsyncEngine, asyncio.Task] = {}
+
+    async def _probe(self, engine: AsyncEngine):
+        try:
+            async with asyncio.timeout(self.probe_timeout):
+                async with engine.connect() as conn:
+                    await conn.execute(text('SELECT 1'))
+            healthy = True
+        except (SQLAlchemyError, OSError, TimeoutError):
+            healthy = False
+        finally:
+            del self._probes[engine]
+
+        self._health[engine] = (healthy, time.monotonic())
+
+    def probe(self, engine: AsyncEngine) -> asyncio.Task:
+        # one probe in flight per replica, however many reads want one
+        if engine not in self._probes:
+            self._probes[engine] = asyncio.create_task(self._probe(engine))
+
+        return self._probes[engine]
+
+    async def check(self):
+        await asyncio.gather(*(self.probe(engine) for engine in self.engines))
+
+    def is_healthy(self, engine: AsyncEngine) -> bool:
+        # reads go by the last known state while a stale one is refreshed
+        # in the background, so a hung replica never holds a request up
+        healthy, checked_at = self._health.get(engine, (True, 0.0))
+        if time.monotonic() - checked_at >= self.health_interval:
+            self.probe(engine)
+
+        return healthy
+
+    def choose(self) -> AsyncEngine | None:
+        for _ in self.engines:
+            engine = self.engines[next(self._turn) % len(self.engines)]
+            if self.is_healthy(engine):
+                return engine
+
+        return None
+
+    async def dispose(self):
+        for task in list(self._probes.values()):
+            task.cancel()
+        await asyncio.gather(*self._probes.values(), return_exceptions=True)
+        self._probes.clear()
+        for engine in self.engines:
+            await engine.dispose()
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                'url': engine.url.render_as_string(hide_password=True),
+                'healthy': self._health.get(engine, (True, 0.0))[0],
+            }
+            for engine in self.engines
+        ]
+
+
+def dialect_insert(session: AsyncSession, model):
+    if session.bind.dialect.name == 'sqlite':
+        return sqlite.insert(model)
+
+    return postgresql.insert(model)
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    if isinstance(pool, InstrumentedPool):
+        return pool.stats()
+
+    return {'status': pool.status()}
+
+
+settings = get_settings()
+engine = build_engine(settings)
+replicas = ReplicaSet(
+    [
+        build_engine(settings, url, settings.READ_REPLICA_CONNECT_TIMEOUT)
+        for url in settings.READ_REPLICA_URLS
+    ],
+    health_interval=settings.READ_REPLICA_HEALTH_INTERVAL,
+    probe_timeout=settings.READ_REPLICA_CONNECT_TIMEOUT,
+)
+# bearer tokens that just wrote, read back from the primary for a while
+primary_pins = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.READ_YOUR_WRITES_WINDOW,
+)
+
+
+def pin_to_primary(token: str):
+    primary_pins.set(token, True)
+
+
+def is_pinned(request: Request) -> bool:
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and primary_pins.get(token, False)
+
+
+async def read_engine(request: Request) -> AsyncEngine:
+    primary = request.app.state.engine
+    if is_pinned(request):
+        request.state.read_from_primary = True
+        return primary
+
+    replica = replicas.choose()
+    if replica is None:
+        return primary
+
+    request.state.read_from_replica = True
+    return replica
+
+
+async def get_session(request: Request):  # pragma: no cover
+    async with AsyncSession(request.app.state.engine) as session:
+        yield session
+
+
+async def get_read_session(request: Request):  # pragma: no cover
+    async with AsyncSession(await read_engine(request)) as session:
         yield session
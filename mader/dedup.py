@@ -0,0 +1,103 @@
+import hashlib
+import random
+from collections import defaultdict
+from functools import cache
+from itertools import combinations
+from typing import Hashable, Iterator
+
+from mader.utils import sanitize_username
+
+# 15 bands of 3 rows: names with a trigram Jaccard of 0.6 share a bucket
+# with probability ~0.97, while unrelated names almost never do
+BANDS = 15
+ROWS = 3
+_random = random.Random(0)
+MASKS = [_random.getrandbits(64) for _ in range(BANDS * ROWS)]
+
+
+def shingles(name: str, size: int = 3) -> frozenset[str]:
+    # token order doesn't matter: "saramago jose" is "jose saramago"
+    padded = f' {" ".join(sorted(sanitize_username(name).split()))} '
+    return frozenset(
+        padded[i : i + size] for i in range(max(len(padded) - size + 1, 1))
+    )
+
+
+@cache
+def gram_hash(gram: str) -> int:
+    # sanitized names have at most 37 ** 3 distinct trigrams
+    return int.from_bytes(
+        hashlib.blake2b(gram.encode(), digest_size=8).digest()
+    )
+
+
+def signature(grams: frozenset[str]) -> list[int]:
+    # xor with a random mask permutes the hashes, and keeps min() in C
+    hashes = [gram_hash(gram) for gram in grams]
+    return [min(map(mask.__xor__, hashes)) for mask in MASKS]
+
+
+def jaccard(first: frozenset, second: frozenset) -> float:
+    return len(first & second) / len(first | second)
+
+
+class DuplicateIndex:
+    # MinHash LSH: every name is hashed into BANDS buckets once, and only
+    # names sharing a bucket are compared, instead of every pair
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.shingles: dict[Hashable, frozenset[str]] = {}
+        self.buckets: dict[tuple, list[Hashable]] = defaultdict(list)
+
+    def add(self, key: Hashable, name: str):
+        grams = shingles(name)
+        self.shingles[key] = grams
+        minhashes = signature(grams)
+        for band in range(BANDS):
+            rows = tuple(minhashes[band * ROWS : (band + 1) * ROWS])
+            self.buckets[band, rows].append(key)
+
+    def candidates(self) -> set[tuple]:
+        return {
+            pair
+            for keys in self.buckets.values()
+            if len(keys) > 1
+            for pair in combinations(keys, 2)
+        }
+
+    def pairs(self) -> Iterator[tuple]:
+        for first, second in self.candidates():
+            if (
+                jaccard(self.shingles[first], self.shingles[second])
+                >= self.threshold
+            ):
+                yield first, second
+
+    def groups(self) -> list[list[Hashable]]:
+        parents = {}
+
+        def root(key):
+            while parents.get(key, key) != key:
+                key = parents[key]
+            return key
+
+        for pair in self.pairs():
+            first, second = sorted(map(root, pair))
+            if first != second:
+                parents[second] = first
+
+        groups = defaultdict(list)
+        for key in parents:
+            groups[root(key)].append(key)
+
+        return sorted(sorted([first, *rest]) for first, rest in groups.items())
+
+
+def duplicate_groups(
+    romancists: list[tuple[int, str]], threshold: float
+) -> list[list[int]]:
+    index = DuplicateIndex(threshold)
+    for romancist_id, name in romancists:
+        index.add(romancist_id, name)
+
+    return index.groups()
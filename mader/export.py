@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from enum import Enum
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mader.settings import get_settings
+
+settings = get_settings()
+
+
+class ExportFormat(str, Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: 'application/x-ndjson',
+    ExportFormat.csv: 'text/csv',
+}
+
+
+def encode_ndjson(rows: list[dict], _: list[str]) -> str:
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def encode_csv(rows: list[dict], fields: list[str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+ENCODERS = {ExportFormat.ndjson: encode_ndjson, ExportFormat.csv: encode_csv}
+
+
+def export_response(
+    session: AsyncSession,
+    query: Select,
+    schema: type[BaseModel],
+    export_format: ExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    fields = list(schema.model_fields)
+    encode = ENCODERS[export_format]
+
+    async def content():
+        # the session dependency has already been exited by the time the
+        # body is streamed, so the generator owns the session from here on
+        try:
+            if export_format == ExportFormat.csv:
+                yield ','.join(fields) + '\r\n'
+
+            result = await session.stream_scalars(
+                query,
+                execution_options={'yield_per': settings.EXPORT_BATCH_SIZE},
+            )
+            async for partition in result.partitions():
+                yield encode(
+                    [
+                        {field: getattr(row, field) for field in fields}
+                        for row in partition
+                    ],
+                    fields,
+                )
+        finally:
+            await session.close()
+
+    return StreamingResponse(
+        content(),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename="{filename}.{export_format.value}"'
+            )
+        },
+    )
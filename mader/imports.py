@@ -0,0 +1,271 @@
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+from http import HTTPStatus
+from itertools import islice
+from typing import IO, Iterator
+
+from anyio import to_thread
+from fastapi import HTTPException, Request
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from mader.budget import outside_budget
+from mader.cache import invalidate_responses
+from mader.database import dialect_insert
+from mader.export import ExportFormat
+from mader.models import Book, ImportJob, Romancist
+from mader.settings import get_settings
+from mader.utils import sanitize_username
+
+logger = logging.getLogger('mader.imports')
+settings = get_settings()
+
+CATALOG_FIELDS = ('romancist', 'title', 'year')
+# what fits books.year, an integer column: one row out of it would fail
+# the whole batch
+YEAR_RANGE = range(-(2**31), 2**31)
+
+CREATE_STAGING = text(
+    'CREATE TEMPORARY TABLE import_staging '
+    '(position bigint, romancist text, title text, year integer) '
+    'ON COMMIT DROP'
+)
+COPY_STAGING = (
+    'COPY import_staging (position, romancist, title, year) FROM STDIN'
+)
+MERGE_ROMANCISTS = text(
+    'INSERT INTO romancists (name) '
+    'SELECT DISTINCT romancist FROM import_staging '
+    'ON CONFLICT (name) DO NOTHING'
+)
+# a title repeated within the batch keeps its last row, as it would if
+# the rows had been upserted one by one
+MERGE_BOOKS = text(
+    'INSERT INTO books (title, year, romancist_id) '
+    'SELECT DISTINCT ON (staging.title) '
+    'staging.title, staging.year, romancists.id '
+    'FROM import_staging AS staging '
+    'JOIN romancists ON romancists.name = staging.romancist '
+    'ORDER BY staging.title, staging.position DESC '
+    'ON CONFLICT (title) DO UPDATE '
+    'SET year = excluded.year, romancist_id = excluded.romancist_id'
+)
+
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        detail=f'Imports are limited to {settings.IMPORT_MAX_BYTES} bytes',
+    )
+
+
+async def receive_upload(request: Request) -> str:
+    declared = request.headers.get('content-length', '')
+    if declared.isdigit() and int(declared) > settings.IMPORT_MAX_BYTES:
+        raise upload_too_large()
+
+    # spooled to disk as it arrives: the body is never held in memory. The
+    # size is checked as it streams too, Content-Length can be absent
+    upload = tempfile.NamedTemporaryFile(prefix='mader-import-', delete=False)
+    received = 0
+    try:
+        with upload:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > settings.IMPORT_MAX_BYTES:
+                    raise upload_too_large()
+                upload.write(chunk)
+    except BaseException:
+        os.unlink(upload.name)
+        raise
+
+    return upload.name
+
+
+def read_records(file: IO[str], import_format: ExportFormat) -> Iterator:
+    if import_format == ExportFormat.csv:
+        yield from csv.DictReader(file)
+        return
+
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def normalize_batch(records: list) -> tuple[list[tuple], int]:
+    # names repeat a lot within a catalog, so each is sanitized once per
+    # batch
+    names: dict[str, str] = {}
+    rows, rejected = [], 0
+    for record in records:
+        values = (
+            [record.get(field) for field in CATALOG_FIELDS]
+            if isinstance(record, dict)
+            else [None]
+        )
+        if not all(isinstance(value, (str, int)) for value in values):
+            rejected += 1
+            continue
+
+        romancist, title, year = (str(value) for value in values)
+        try:
+            year = int(year)
+        except ValueError:
+            rejected += 1
+            continue
+        if year not in YEAR_RANGE:
+            rejected += 1
+            continue
+
+        for name in (romancist, title):
+            if name not in names:
+                names[name] = sanitize_username(name)
+
+        if names[romancist] and names[title]:
+            rows.append((names[romancist], names[title], year))
+        else:
+            rejected += 1
+
+    return rows, rejected
+
+
+def read_batch(records: Iterator) -> tuple[list[tuple], int, bool]:
+    batch = list(islice(records, settings.IMPORT_BATCH_SIZE))
+    rows, rejected = normalize_batch(batch)
+    return rows, rejected, len(batch) < settings.IMPORT_BATCH_SIZE
+
+
+async def copy_and_merge(session: AsyncSession, rows: list[tuple]):
+    await session.execute(CREATE_STAGING)
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    async with raw_connection.driver_connection.cursor() as cursor:
+        async with cursor.copy(COPY_STAGING) as copy:
+            for position, row in enumerate(rows):
+                await copy.write_row((position, *row))
+
+    await session.execute(MERGE_ROMANCISTS)
+    await session.execute(MERGE_BOOKS)
+
+
+async def upsert_rows(session: AsyncSession, rows: list[tuple]):
+    names = {romancist for romancist, _, _ in rows}
+    await session.execute(
+        dialect_insert(session, Romancist).on_conflict_do_nothing(
+            index_elements=['name']
+        ),
+        [{'name': name} for name in names],
+    )
+    romancist_ids = dict(
+        (
+            await session.execute(
+                select(Romancist.name, Romancist.id).where(
+                    Romancist.name.in_(names)
+                )
+            )
+        ).all()
+    )
+
+    insert = dialect_insert(session, Book)
+    await session.execute(
+        insert.on_conflict_do_update(
+            index_elements=['title'],
+            set_={
+                'year': insert.excluded.year,
+                'romancist_id': insert.excluded.romancist_id,
+            },
+        ),
+        [
+            {
+                'title': title,
+                'year': year,
+                'romancist_id': romancist_ids[romancist],
+            }
+            for romancist, title, year in rows
+        ],
+    )
+
+
+async def load_batch(session: AsyncSession, rows: list[tuple]):
+    if session.bind.dialect.name == 'postgresql':
+        await copy_and_merge(session, rows)
+    else:
+        await upsert_rows(session, rows)
+
+
+async def update_job(session: AsyncSession, job_id: int, **values):
+    await session.execute(
+        update(ImportJob).where(ImportJob.id == job_id).values(**values)
+    )
+
+
+async def import_file(
+    session: AsyncSession,
+    job_id: int,
+    path: str,
+    import_format: ExportFormat,
+    started: float,
+):
+    processed = rejected = 0
+    with open(path, encoding='utf-8', newline='') as file:
+        records = read_records(file, import_format)
+        done = False
+        while not done:
+            # parsing is CPU bound and would stall the event loop
+            rows, batch_rejected, done = await to_thread.run_sync(
+                read_batch, records
+            )
+            if rows:
+                await load_batch(session, rows)
+
+            processed += len(rows)
+            rejected += batch_rejected
+            # progress commits together with its batch, and each batch
+            # gives its connection back to the pool
+            await update_job(
+                session,
+                job_id,
+                rows_processed=processed,
+                rows_rejected=rejected,
+                elapsed_seconds=time.perf_counter() - started,
+            )
+            await session.commit()
+            invalidate_responses('books', 'romancists')
+
+
+async def run_import(
+    engine: AsyncEngine, job_id: int, path: str, import_format: ExportFormat
+):
+    started = time.perf_counter()
+
+    with outside_budget():
+        async with AsyncSession(engine) as session:
+            try:
+                await update_job(session, job_id, status='running')
+                await session.commit()
+                await import_file(
+                    session, job_id, path, import_format, started
+                )
+                await update_job(session, job_id, status='done')
+                await session.commit()
+            except Exception as exc:
+                logger.exception('import %s failed', job_id)
+                await session.rollback()
+                await update_job(
+                    session,
+                    job_id,
+                    status='failed',
+                    error=str(exc),
+                    elapsed_seconds=time.perf_counter() - started,
+                )
+                await session.commit()
+            finally:
+                os.unlink(path)
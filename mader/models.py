@@ -1,10 +1,34 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import DDL, ForeignKey, Index, event, func, text
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
 
 table_registry = registry()
 
+event.listen(
+    table_registry.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(
+        dialect='postgresql'
+    ),
+)
+
+
+def search_indexes(table: str, column: str) -> tuple[Index, Index]:
+    return (
+        Index(
+            f'ix_{table}_{column}_trgm',
+            column,
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            f'ix_{table}_{column}_tsv',
+            text(f"to_tsvector('simple', {column})"),
+            postgresql_using='gin',
+        ).ddl_if(dialect='postgresql'),
+    )
+
 
 @table_registry.mapped_as_dataclass
 class User:
@@ -25,26 +49,59 @@ class User:
 @table_registry.mapped_as_dataclass
 class Book:
     __tablename__ = 'books'
+    __table_args__ = (
+        *search_indexes('books', 'title'),
+        Index('ix_books_year', 'year', 'id'),
+        Index('ix_books_romancist_id', 'romancist_id', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
-    title: Mapped[str]
-    year: Mapped[str]
-    romancist_id: Mapped[int] = mapped_column(ForeignKey('romancists.id'))
+    title: Mapped[str] = mapped_column(index=True, unique=True)
+    year: Mapped[int]
+    romancist_id: Mapped[int] = mapped_column(
+        ForeignKey('romancists.id', ondelete='CASCADE')
+    )
     romancist: Mapped['Romancist'] = relationship(
         init=False,
         back_populates='books',
+        lazy='raise',
     )
 
 
 @table_registry.mapped_as_dataclass
 class Romancist:
     __tablename__ = 'romancists'
+    __table_args__ = search_indexes('romancists', 'name')
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
-    name: Mapped[str]
+    name: Mapped[str] = mapped_column(index=True, unique=True)
     books: Mapped[list['Book']] = relationship(
         init=False,
         back_populates='romancist',
         cascade='all, delete-orphan',
-        # lazy='joined',
+        passive_deletes=True,
+        lazy='raise',
+    )
+
+
+@table_registry.mapped_as_dataclass
+class ImportJob:
+    __tablename__ = 'import_jobs'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    import_format: Mapped[str]
+    # jobs from before imports had owners have none, and nobody sees them
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), index=True
+    )
+    status: Mapped[str] = mapped_column(default='pending')
+    rows_processed: Mapped[int] = mapped_column(default=0)
+    rows_rejected: Mapped[int] = mapped_column(default=0)
+    elapsed_seconds: Mapped[float] = mapped_column(default=0.0)
+    error: Mapped[str | None] = mapped_column(default=None)
+    created_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now(), onupdate=func.now()
     )
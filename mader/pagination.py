@@ -0,0 +1,148 @@
+import base64
+import json
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from mader.cache import TTLCache
+from mader.schemas import PageParams
+from mader.settings import get_settings
+from mader.timing import timed
+
+settings = get_settings()
+count_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_SIZE, ttl=settings.COUNT_CACHE_TTL
+)
+TABLE_ESTIMATE = text(
+    'SELECT reltuples::bigint FROM pg_class '
+    'WHERE oid = CAST(:table AS regclass)'
+)
+
+
+def encode_cursor(*keys) -> str:
+    raw = json.dumps(keys, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        keys = json.loads(raw)
+    except ValueError:
+        keys = None
+
+    if not (
+        isinstance(keys, list)
+        and keys
+        and all(type(key) is int for key in keys)
+    ):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail='Invalid cursor',
+        )
+
+    return keys
+
+
+def page_size(limit: int) -> int:
+    return max(1, min(limit, settings.MAX_PAGE_SIZE))
+
+
+async def paginate(
+    session: AsyncSession,
+    query: Select,
+    key: InstrumentedAttribute | tuple[InstrumentedAttribute, ...],
+    page: PageParams,
+):
+    keys = key if isinstance(key, tuple) else (key,)
+    limit = page_size(page.limit)
+
+    if page.cursor:
+        values = decode_cursor(page.cursor)
+        if len(values) != len(keys):
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail='Invalid cursor',
+            )
+        # a row comparison seeks straight into a composite index
+        query = query.where(
+            keys[0] > values[0]
+            if len(keys) == 1
+            else tuple_(*keys) > tuple_(*values)
+        )
+    elif page.offset:
+        query = query.offset(page.offset)
+
+    result = await session.execute(query.order_by(*keys).limit(limit + 1))
+    # a single entity comes back as objects, column selects as rows
+    if len(query.column_descriptions) == 1:
+        result = result.scalars()
+    rows = result.all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(*(getattr(rows[-1], k.key) for k in keys))
+
+
+async def table_estimate(session: AsyncSession, query: Select) -> int:
+    # planner statistics, -1 on a table never analyzed
+    (table,) = query.get_final_froms()
+    return await session.scalar(TABLE_ESTIMATE, {'table': table.name})
+
+
+async def plan_estimate(session: AsyncSession, query: Select) -> int:
+    connection = await session.connection()
+    compiled = query.compile(dialect=connection.dialect)
+    result = await connection.exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+    )
+    return int(result.scalar()[0]['Plan']['Plan Rows'])
+
+
+async def count_total(session: AsyncSession, query: Select):
+    threshold = settings.EXACT_COUNT_THRESHOLD
+    if session.bind.dialect.name != 'postgresql':
+        total = await session.scalar(
+            select(func.count()).select_from(query.subquery())
+        )
+        return total, False
+
+    if query.whereclause is None:
+        estimate = await table_estimate(session, query)
+        if estimate > threshold:
+            return estimate, True
+
+    # never counts past the threshold, so a broad filter costs no more
+    # than a narrow one
+    total = await session.scalar(
+        select(func.count()).select_from(query.limit(threshold + 1).subquery())
+    )
+    if total <= threshold:
+        return total, False
+
+    return max(await plan_estimate(session, query), total), True
+
+
+async def page_total(session: AsyncSession, query: Select, page: PageParams):
+    if not page.include_total:
+        return {}
+
+    # the cursor doesn't change the total, so every page of the same
+    # filters shares one count
+    cache_key = query._generate_cache_key()
+    key = (
+        cache_key.key,
+        tuple(param.effective_value for param in cache_key.bindparams),
+    )
+    counted = count_cache.get(key)
+    if counted is None:
+        with timed('count'):
+            counted = await count_total(session, query)
+        count_cache.set(key, counted)
+
+    total, estimated = counted
+    return {'total': total, 'total_is_estimate': estimated}
@@ -1,25 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
 
+from mader.admission import limit_auth_attempts
+from mader.budget import query_budget
 from mader.common import T_Oauth2Form, T_Session
 from mader.models import User
 from mader.schemas import TokenSchema
 from mader.security import (
     create_access_token,
     get_current_user,
-    verify_password,
+    verify_password_async,
 )
+from mader.statements import USER_BY_EMAIL
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 
-@router.post('/token', response_model=TokenSchema)
+@router.post(
+    '/token',
+    response_model=TokenSchema,
+    dependencies=[Depends(limit_auth_attempts)],
+)
+@query_budget(1)
 async def login_for_access_token(form_data: T_Oauth2Form, session: T_Session):
-    user = await session.scalar(
-        select(User).where(User.email == form_data.username)
-    )
+    user = await session.scalar(USER_BY_EMAIL, {'email': form_data.username})
 
-    if not user or not verify_password(form_data.password, user.password):
+    if not user or not await verify_password_async(
+        form_data.password, user.password
+    ):
         raise HTTPException(
             status_code=400, detail='Incorrect email or password'
         )
@@ -29,6 +36,7 @@ async def login_for_access_token(form_data: T_Oauth2Form, session: T_Session):
 
 
 @router.post('/refresh_token', response_model=TokenSchema)
+@query_budget(1)
 def refresh_access_token(current_user: User = Depends(get_current_user)):
     access_token = create_access_token({'sub': current_user.email})
     return {'access_token': access_token, 'token_type': 'Bearer'}
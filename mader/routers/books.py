@@ -1,66 +1,201 @@
 from http import HTTPStatus
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from mader.common import T_CurrentUser, T_Session
+from mader.budget import query_budget
+from mader.cache import cached_response, invalidate_responses
+from mader.common import T_CurrentUser, T_ReadSession, T_Session
+from mader.database import dialect_insert
+from mader.export import ExportFormat, export_response
 from mader.models import Book, Romancist
+from mader.pagination import page_total, paginate
 from mader.schemas import (
     BookPublic,
+    BooksBulkResult,
     BookSchema,
+    BooksFilter,
     BooksList,
     BookUpdate,
     Message,
 )
+from mader.serialization import columns_for, dump_json, rows_as_dicts
+from mader.settings import get_settings
+from mader.statements import (
+    BOOK_BY_ID,
+    BOOK_ROW_BY_ID,
+    DELETE_BOOK,
+    ROMANCIST_EXISTS,
+)
+from mader.timing import timed
 from mader.utils import sanitize_username
 
 router = APIRouter(prefix='/books', tags=['books'])
+settings = get_settings()
+# both orders are served by an index: the primary key, or ix_books_year
+# on (year, id)
+BOOK_ORDERS = {'id': Book.id, 'year': (Book.year, Book.id)}
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=BookPublic)
+@query_budget(3)
 async def create_book(
     book: BookSchema, session: T_Session, current_user: T_CurrentUser
 ):
-    sanitized_title = sanitize_username(book.title)
-
-    db_book = await session.scalar(
-        select(Book)
-        .where(Book.title == sanitized_title)
-        .options(selectinload(Book.romancist))
+    # the romancist lookup is the source of the inserted row, so a missing
+    # romancist and a duplicate title both come back as zero rows
+    result = await session.execute(
+        dialect_insert(session, Book)
+        .from_select(
+            ['title', 'year', 'romancist_id'],
+            select(
+                literal(sanitize_username(book.title)),
+                literal(book.year),
+                Romancist.id,
+            ).where(Romancist.id == book.romancist_id),
+        )
+        .on_conflict_do_nothing(index_elements=['title'])
+        .returning(Book.id, Book.title, Book.year, Book.romancist_id)
     )
+    db_book = result.mappings().one_or_none()
 
-    db_romancist = await session.scalar(
-        select(Romancist).where(Romancist.id == book.romancist_id)
-    )
+    if not db_book:
+        db_romancist = await session.scalar(
+            ROMANCIST_EXISTS, {'romancist_id': book.romancist_id}
+        )
+        if not db_romancist:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail='Romancist not found',
+            )
 
-    if db_book:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Book already exists in the MADR',
         )
 
-    if not db_romancist:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail='Romancist not found',
+    await session.commit()
+    invalidate_responses('books')
+
+    return db_book
+
+
+async def existing_romancists(
+    session: AsyncSession, romancist_ids: set[int]
+) -> set[int]:
+    return set(
+        await session.scalars(
+            select(Romancist.id).where(Romancist.id.in_(romancist_ids))
         )
+    )
 
-    db_book = Book(
-        title=sanitized_title, year=book.year, romancist_id=book.romancist_id
+
+async def insert_books(
+    session: AsyncSession, rows: dict[int, dict], conflicts: list[dict]
+) -> list:
+    while rows:
+        try:
+            result = await session.execute(
+                dialect_insert(session, Book)
+                .on_conflict_do_nothing(index_elements=['title'])
+                .returning(Book.id, Book.title, Book.year, Book.romancist_id),
+                list(rows.values()),
+            )
+        except IntegrityError:
+            # a romancist was deleted after it was looked up: its rows are
+            # reported, and the others tried again
+            await session.rollback()
+            romancist_ids = await existing_romancists(
+                session, {row['romancist_id'] for row in rows.values()}
+            )
+            missing = [
+                index
+                for index, row in rows.items()
+                if row['romancist_id'] not in romancist_ids
+            ]
+            if not missing:
+                raise
+
+            for index in missing:
+                del rows[index]
+                conflicts.append({
+                    'index': index,
+                    'detail': 'Romancist not found',
+                })
+        else:
+            return sorted(result.mappings().all(), key=lambda row: row['id'])
+
+    return []
+
+
+@router.post(
+    '/bulk', status_code=HTTPStatus.CREATED, response_model=BooksBulkResult
+)
+# a romancist deleted while the request runs costs two more statements
+@query_budget(6)
+async def create_books(
+    books: Annotated[
+        list[BookSchema], Body(max_length=settings.MAX_BULK_SIZE)
+    ],
+    session: T_Session,
+    current_user: T_CurrentUser,
+):
+    titles = [sanitize_username(book.title) for book in books]
+    existing_titles = set(
+        await session.scalars(
+            select(Book.title).where(Book.title.in_(set(titles)))
+        )
+    )
+    romancist_ids = await existing_romancists(
+        session, {book.romancist_id for book in books}
     )
-    session.add(db_book)
-    await session.commit()
-    await session.refresh(db_book)
 
-    return db_book
+    rows, conflicts = {}, []
+    for index, (book, title) in enumerate(zip(books, titles)):
+        if title in existing_titles:
+            conflicts.append({
+                'index': index,
+                'detail': 'Book already exists in the MADR',
+            })
+        elif book.romancist_id not in romancist_ids:
+            conflicts.append({'index': index, 'detail': 'Romancist not found'})
+        else:
+            existing_titles.add(title)
+            rows[index] = {
+                'title': title,
+                'year': book.year,
+                'romancist_id': book.romancist_id,
+            }
+
+    created = await insert_books(session, rows, conflicts)
+    if created:
+        await session.commit()
+        invalidate_responses('books')
+
+    # rows inserted concurrently by another request after the lookup above
+    inserted = {row['title'] for row in created}
+    conflicts.extend(
+        {'index': index, 'detail': 'Book already exists in the MADR'}
+        for index, row in rows.items()
+        if row['title'] not in inserted
+    )
+
+    return {
+        'books': created,
+        'conflicts': sorted(conflicts, key=lambda item: item['index']),
+    }
 
 
 @router.delete('/{book_id}', response_model=Message)
+@query_budget(2)
 async def delete_book(
     book_id: int, session: T_Session, current_user: T_CurrentUser
 ):
-    db_book = await session.scalar(select(Book).where(Book.id == book_id))
+    db_book = await session.scalar(DELETE_BOOK, {'book_id': book_id})
 
     if not db_book:
         raise HTTPException(
@@ -68,63 +203,130 @@ async def delete_book(
             detail='Book not found',
         )
 
-    await session.delete(db_book)
     await session.commit()
+    invalidate_responses('books')
 
     return {'message': 'Book deleted'}
 
 
+@router.get('/export', response_class=StreamingResponse)
+@query_budget(1)
+async def export_books(
+    session: T_ReadSession, export_format: ExportFormat = ExportFormat.ndjson
+):
+    return export_response(
+        session,
+        select(Book).order_by(Book.id),
+        BookPublic,
+        export_format,
+        'books',
+    )
+
+
 @router.get('/{book_id}', response_model=BookPublic)
-async def read_book(session: T_Session, book_id: int):
-    db_book = await session.scalar(select(Book).where(Book.id == book_id))
+@query_budget(1)
+async def read_book(session: T_ReadSession, book_id: int, request: Request):
+    async def render():
+        db_book = await session.scalar(BOOK_BY_ID, {'book_id': book_id})
 
-    if not db_book:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail='Book not found',
-        )
+        if not db_book:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail='Book not found',
+            )
 
-    return db_book
+        with timed('serialize'):
+            return BookPublic.model_validate(
+                db_book, from_attributes=True
+            ).model_dump_json()
+
+    return await cached_response(request, 'books', render)
 
 
 @router.get('/', response_model=BooksList)
+@query_budget(3)
 async def read_books(
-    session: T_Session,
-    title: str | None = None,
-    year: str | None = None,
-    limit: int = 20,
-    offset: int = 0,
+    session: T_ReadSession,
+    book_filter: Annotated[BooksFilter, Depends()],
+    request: Request,
 ):
-    query = select(Book)
+    async def render():
+        query = select(*columns_for(Book, BookPublic))
+
+        if book_filter.title:
+            query = query.filter(Book.title.contains(book_filter.title))
 
-    if title:
-        query = query.filter(Book.title.contains(title))
+        if book_filter.year is not None:
+            query = query.filter(Book.year == book_filter.year)
 
-    if year:
-        query = query.filter(Book.year == year)
+        if book_filter.year_from is not None:
+            query = query.filter(Book.year >= book_filter.year_from)
 
-    books = await session.scalars(query.offset(offset).limit(limit))
-    return {'books': books}
+        if book_filter.year_to is not None:
+            query = query.filter(Book.year <= book_filter.year_to)
+
+        books, next_cursor = await paginate(
+            session, query, BOOK_ORDERS[book_filter.order_by], book_filter
+        )
+        total = await page_total(session, query, book_filter)
+        with timed('serialize'):
+            return dump_json(
+                BooksList,
+                {
+                    'books': rows_as_dicts(books),
+                    'next_cursor': next_cursor,
+                    **total,
+                },
+            )
+
+    return await cached_response(request, 'books', render)
 
 
 @router.patch('/{book_id}', response_model=BookPublic)
+@query_budget(3)
 async def update_book(
     session: T_Session,
     book_id: int,
     book: BookUpdate,
     current_user: T_CurrentUser,
 ):
-    db_book = await session.scalar(select(Book).where(Book.id == book_id))
+    values = book.model_dump(exclude_unset=True, exclude_none=True)
+    if values:
+        query, params = (
+            update(Book)
+            .where(Book.id == book_id)
+            .values(**values)
+            .returning(*BOOK_ROW_BY_ID.selected_columns),
+            None,
+        )
+    else:
+        query, params = BOOK_ROW_BY_ID, {'book_id': book_id}
+
+    try:
+        result = await session.execute(query, params)
+        db_book = result.mappings().one_or_none()
+    except IntegrityError:
+        await session.rollback()
+        if 'romancist_id' in values and not await session.scalar(
+            ROMANCIST_EXISTS, {'romancist_id': values['romancist_id']}
+        ):
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail='Romancist not found',
+            )
+
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='Book already exists in the MADR',
+        )
+
     if not db_book:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Book not found',
         )
 
-    for key, value in book.model_dump(exclude_unset=True).items():
-        setattr(db_book, key, value)
-
     await session.commit()
-    await session.refresh(db_book)
+    invalidate_responses('books')
 
     return db_book
@@ -0,0 +1,62 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from sqlalchemy import insert, select
+
+from mader.budget import query_budget
+from mader.common import T_CurrentUser, T_Session
+from mader.export import ExportFormat
+from mader.imports import receive_upload, run_import
+from mader.models import ImportJob
+from mader.schemas import ImportJobPublic
+
+router = APIRouter(prefix='/imports', tags=['imports'])
+
+
+@router.post(
+    '/', status_code=HTTPStatus.ACCEPTED, response_model=ImportJobPublic
+)
+@query_budget(2)
+async def create_import(
+    request: Request,
+    session: T_Session,
+    current_user: T_CurrentUser,
+    background_tasks: BackgroundTasks,
+    import_format: ExportFormat = ExportFormat.ndjson,
+):
+    user_id = current_user.id
+    # authenticating may have checked out a connection: hand it back
+    # before streaming a body that can take minutes to arrive
+    await session.close()
+    path = await receive_upload(request)
+    job = await session.scalar(
+        insert(ImportJob)
+        .values(import_format=import_format.value, user_id=user_id)
+        .returning(ImportJob)
+    )
+    public_job = ImportJobPublic.model_validate(job, from_attributes=True)
+    await session.commit()
+
+    background_tasks.add_task(
+        run_import, request.app.state.engine, job.id, path, import_format
+    )
+    return public_job
+
+
+@router.get('/{import_id}', response_model=ImportJobPublic)
+@query_budget(2)
+async def read_import(
+    import_id: int, session: T_Session, current_user: T_CurrentUser
+):
+    job = await session.scalar(
+        select(ImportJob).where(
+            ImportJob.id == import_id, ImportJob.user_id == current_user.id
+        )
+    )
+    if not job:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail='Import not found',
+        )
+
+    return job
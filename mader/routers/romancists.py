@@ -1,51 +1,227 @@
 from http import HTTPStatus
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, HTTPException
-from sqlalchemy import select
+from anyio import to_thread
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from mader.common import T_CurrentUser, T_Session
-from mader.models import Romancist
+from mader.budget import query_budget
+from mader.cache import cached_response, invalidate_responses
+from mader.common import T_CurrentUser, T_ReadSession, T_Session
+from mader.database import dialect_insert
+from mader.dedup import duplicate_groups
+from mader.export import ExportFormat, export_response
+from mader.models import Book, Romancist
+from mader.pagination import page_total, paginate
 from mader.schemas import (
+    BookPublic,
+    BooksList,
     Message,
+    PageParams,
+    RomancistDuplicates,
+    RomancistMerge,
+    RomancistMergeResult,
     RomancistPublic,
+    RomancistsBulkResult,
     RomancistSchema,
+    RomancistsFilter,
     RomancistsList,
     RomancistUpdate,
+    RomancistWithBooks,
 )
+from mader.serialization import columns_for, dump_json, rows_as_dicts
+from mader.settings import get_settings
+from mader.statements import (
+    DELETE_ROMANCIST,
+    ROMANCIST_BY_ID,
+    ROMANCIST_ROW_BY_ID,
+)
+from mader.timing import timed
 from mader.utils import sanitize_username
 
 router = APIRouter(prefix='/romancists', tags=['romancists'])
+settings = get_settings()
 
 
 @router.post(
     '/', response_model=RomancistPublic, status_code=HTTPStatus.CREATED
 )
+@query_budget(2)
 async def create_romancist(
     romancist: RomancistSchema, session: T_Session, current_user: T_CurrentUser
 ):
-    name = sanitize_username(romancist.name)
-    db_romancist = await session.scalar(
-        select(Romancist).where(Romancist.name == name)
+    result = await session.execute(
+        dialect_insert(session, Romancist)
+        .values(name=sanitize_username(romancist.name))
+        .on_conflict_do_nothing(index_elements=['name'])
+        .returning(Romancist.id, Romancist.name)
     )
+    db_romancist = result.mappings().one_or_none()
 
-    if db_romancist:
+    if not db_romancist:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Romancist already exists in the MADR',
         )
 
-    db_romancist = Romancist(name=name)
-    session.add(db_romancist)
     await session.commit()
-    await session.refresh(db_romancist)
+    invalidate_responses('romancists')
 
     return db_romancist
 
 
-@router.get('/{romancist_id}', response_model=RomancistPublic)
-async def read_romancist(session: T_Session, romancist_id: int):
+@router.post(
+    '/bulk',
+    status_code=HTTPStatus.CREATED,
+    response_model=RomancistsBulkResult,
+)
+@query_budget(3)
+async def create_romancists(
+    romancists: Annotated[
+        list[RomancistSchema], Body(max_length=settings.MAX_BULK_SIZE)
+    ],
+    session: T_Session,
+    current_user: T_CurrentUser,
+):
+    names = [sanitize_username(romancist.name) for romancist in romancists]
+    existing_names = set(
+        await session.scalars(
+            select(Romancist.name).where(Romancist.name.in_(set(names)))
+        )
+    )
+
+    rows, conflicts = {}, []
+    for index, name in enumerate(names):
+        if name in existing_names:
+            conflicts.append({
+                'index': index,
+                'detail': 'Romancist already exists in the MADR',
+            })
+        else:
+            existing_names.add(name)
+            rows[index] = {'name': name}
+
+    created = []
+    if rows:
+        result = await session.execute(
+            dialect_insert(session, Romancist)
+            .on_conflict_do_nothing(index_elements=['name'])
+            .returning(Romancist.id, Romancist.name),
+            list(rows.values()),
+        )
+        created = sorted(result.mappings().all(), key=lambda row: row['id'])
+        await session.commit()
+        invalidate_responses('romancists')
+
+    # rows inserted concurrently by another request after the lookup above
+    inserted = {row['name'] for row in created}
+    conflicts.extend(
+        {'index': index, 'detail': 'Romancist already exists in the MADR'}
+        for index, row in rows.items()
+        if row['name'] not in inserted
+    )
+
+    return {
+        'romancists': created,
+        'conflicts': sorted(conflicts, key=lambda item: item['index']),
+    }
+
+
+@router.get('/export', response_class=StreamingResponse)
+@query_budget(1)
+async def export_romancists(
+    session: T_ReadSession, export_format: ExportFormat = ExportFormat.ndjson
+):
+    return export_response(
+        session,
+        select(Romancist).order_by(Romancist.id),
+        RomancistPublic,
+        export_format,
+        'romancists',
+    )
+
+
+@router.get('/duplicates', response_model=RomancistDuplicates)
+@query_budget(1)
+async def read_romancist_duplicates(session: T_ReadSession, request: Request):
+    async def render():
+        result = await session.execute(select(Romancist.id, Romancist.name))
+        names = dict(result.all())
+        with timed('dedup'):
+            # hashing every name is CPU bound
+            groups = await to_thread.run_sync(
+                duplicate_groups,
+                list(names.items()),
+                settings.DUPLICATE_SIMILARITY,
+            )
+
+        with timed('serialize'):
+            return dump_json(
+                RomancistDuplicates,
+                {
+                    'groups': [
+                        [
+                            {'id': romancist_id, 'name': names[romancist_id]}
+                            for romancist_id in group
+                        ]
+                        for group in groups
+                    ]
+                },
+            )
+
+    return await cached_response(request, 'romancists', render)
+
+
+@router.post('/{romancist_id}/merge', response_model=RomancistMergeResult)
+@query_budget(4)
+async def merge_romancists(
+    romancist_id: int,
+    merge: RomancistMerge,
+    session: T_Session,
+    current_user: T_CurrentUser,
+):
+    # locked so no book can be added to a duplicate between the move and
+    # the delete, which would cascade it away
+    result = await session.execute(
+        select(Romancist.id, Romancist.name)
+        .where(Romancist.id.in_({romancist_id, *merge.duplicate_ids}))
+        .with_for_update()
+    )
+    found = {row['id']: row for row in result.mappings()}
+    if romancist_id not in found:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail='Romancist not found',
+        )
+
+    duplicate_ids = sorted(set(found) - {romancist_id})
+    moved = await session.execute(
+        update(Book)
+        .where(Book.romancist_id.in_(duplicate_ids))
+        .values(romancist_id=romancist_id)
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        delete(Romancist)
+        .where(Romancist.id.in_(duplicate_ids))
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    invalidate_responses('romancists', 'books')
+
+    return {
+        'romancist': found[romancist_id],
+        'merged_ids': duplicate_ids,
+        'books_moved': moved.rowcount,
+    }
+
+
+async def get_romancist_or_404(session: AsyncSession, romancist_id: int):
     romancist = await session.scalar(
-        select(Romancist).where(Romancist.id == romancist_id)
+        ROMANCIST_BY_ID, {'romancist_id': romancist_id}
     )
     if not romancist:
         raise HTTPException(
@@ -56,23 +232,114 @@ async def read_romancist(session: T_Session, romancist_id: int):
     return romancist
 
 
+def books_of(romancist_id: int):
+    return select(*columns_for(Book, BookPublic)).where(
+        Book.romancist_id == romancist_id
+    )
+
+
+@router.get(
+    '/{romancist_id}',
+    response_model=RomancistPublic | RomancistWithBooks,
+)
+@query_budget(2)
+async def read_romancist(
+    session: T_ReadSession,
+    romancist_id: int,
+    request: Request,
+    include: Literal['books'] | None = None,
+):
+    async def render():
+        romancist = await get_romancist_or_404(session, romancist_id)
+        if not include:
+            with timed('serialize'):
+                return RomancistPublic.model_validate(
+                    romancist, from_attributes=True
+                ).model_dump_json()
+
+        books, next_cursor = await paginate(
+            session, books_of(romancist_id), Book.id, PageParams()
+        )
+        with timed('serialize'):
+            return dump_json(
+                RomancistWithBooks,
+                {
+                    'id': romancist.id,
+                    'name': romancist.name,
+                    'books': rows_as_dicts(books),
+                    'next_cursor': next_cursor,
+                },
+            )
+
+    namespaces = ('romancists', 'books') if include else 'romancists'
+    return await cached_response(request, namespaces, render)
+
+
+@router.get('/{romancist_id}/books', response_model=BooksList)
+@query_budget(4)
+async def read_romancist_books(
+    session: T_ReadSession,
+    romancist_id: int,
+    page: Annotated[PageParams, Depends()],
+    request: Request,
+):
+    async def render():
+        await get_romancist_or_404(session, romancist_id)
+        query = books_of(romancist_id)
+        books, next_cursor = await paginate(session, query, Book.id, page)
+        total = await page_total(session, query, page)
+        with timed('serialize'):
+            return dump_json(
+                BooksList,
+                {
+                    'books': rows_as_dicts(books),
+                    'next_cursor': next_cursor,
+                    **total,
+                },
+            )
+
+    return await cached_response(request, ('romancists', 'books'), render)
+
+
 @router.get('/', response_model=RomancistsList)
-async def read_romancists(session: T_Session, name: str | None = None):
-    query = select(Romancist)
+@query_budget(3)
+async def read_romancists(
+    session: T_ReadSession,
+    romancist_filter: Annotated[RomancistsFilter, Depends()],
+    request: Request,
+):
+    async def render():
+        query = select(*columns_for(Romancist, RomancistPublic))
 
-    if name:
-        query = query.filter(Romancist.name.contains(name))
+        if romancist_filter.name:
+            query = query.filter(
+                Romancist.name.contains(romancist_filter.name)
+            )
 
-    romancists = await session.scalars(query)
-    return {'romancists': romancists}
+        romancists, next_cursor = await paginate(
+            session, query, Romancist.id, romancist_filter
+        )
+        total = await page_total(session, query, romancist_filter)
+        with timed('serialize'):
+            return dump_json(
+                RomancistsList,
+                {
+                    'romancists': rows_as_dicts(romancists),
+                    'next_cursor': next_cursor,
+                    **total,
+                },
+            )
+
+    return await cached_response(request, 'romancists', render)
 
 
 @router.delete('/{romancist_id}', response_model=Message)
+@query_budget(2)
 async def delete_romancist(
     romancist_id: int, session: T_Session, current_user: T_CurrentUser
 ):
     romancist = await session.scalar(
-        select(Romancist).where(Romancist.id == romancist_id)
+        DELETE_ROMANCIST, {'romancist_id': romancist_id}
     )
     if not romancist:
         raise HTTPException(
@@ -80,31 +347,47 @@ async def delete_romancist(
             detail='Romancist not found',
         )
 
-    await session.delete(romancist)
     await session.commit()
+    invalidate_responses('romancists', 'books')
     return {'message': 'Romancist deleted from the MADR'}
 
 
 @router.patch('/{romancist_id}', response_model=RomancistPublic)
+@query_budget(2)
 async def update_romancist(
     romancist_id: int,
     romancist: RomancistUpdate,
     session: T_Session,
     current_user: T_CurrentUser,
 ):
-    db_romancist = await session.scalar(
-        select(Romancist).where(Romancist.id == romancist_id)
-    )
+    if romancist.name:
+        query, params = (
+            update(Romancist)
+            .where(Romancist.id == romancist_id)
+            .values(name=sanitize_username(romancist.name))
+            .returning(*ROMANCIST_ROW_BY_ID.selected_columns),
+            None,
+        )
+    else:
+        query, params = ROMANCIST_ROW_BY_ID, {'romancist_id': romancist_id}
+
+    try:
+        result = await session.execute(query, params)
+        db_romancist = result.mappings().one_or_none()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail='Romancist already exists in the MADR',
+        )
+
     if not db_romancist:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Romancist not found',
         )
 
-    if romancist.name:
-        db_romancist.name = sanitize_username(romancist.name)
-
     await session.commit()
-    await session.refresh(db_romancist)
+    invalidate_responses('romancists')
 
     return db_romancist
@@ -0,0 +1,82 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Query
+from sqlalchemy import case, func, literal, literal_column, or_, select
+from sqlalchemy.orm import InstrumentedAttribute
+
+from mader.budget import query_budget
+from mader.common import T_ReadSession
+from mader.models import Book, Romancist
+from mader.pagination import page_size
+from mader.schemas import SearchResults
+from mader.utils import sanitize_username
+
+router = APIRouter(prefix='/search', tags=['search'])
+
+# inlined rather than bound so the planner matches the expression indexes
+TS_CONFIG = literal_column("'simple'")
+
+
+def match_and_rank(column: InstrumentedAttribute, term: str, dialect: str):
+    if dialect == 'postgresql':
+        document = func.to_tsvector(TS_CONFIG, column)
+        query = func.plainto_tsquery(TS_CONFIG, term)
+        condition = or_(
+            document.op('@@')(query),
+            column.op('%')(term),
+            column.contains(term),
+        )
+        rank = func.greatest(
+            func.similarity(column, term), func.ts_rank(document, query)
+        )
+        return condition, rank
+
+    # SQLite has no trigram or full-text support: substring scan only
+    rank = case(
+        (column == term, 1.0),
+        (column.startswith(term), 0.75),
+        else_=literal(0.5),
+    )
+    return column.contains(term), rank
+
+
+@router.get('/', response_model=SearchResults)
+@query_budget(2)
+async def search(
+    session: T_ReadSession,
+    q: Annotated[str, Query(min_length=1)],
+    limit: int = 20,
+):
+    term = sanitize_username(q)
+    if not term:
+        return {'books': [], 'romancists': []}
+
+    limit = page_size(limit)
+    dialect = session.bind.dialect.name
+
+    condition, rank = match_and_rank(Book.title, term, dialect)
+    books = await session.execute(
+        select(
+            Book.id,
+            Book.title,
+            Book.year,
+            Book.romancist_id,
+            rank.label('rank'),
+        )
+        .where(condition)
+        .order_by(rank.desc(), Book.id)
+        .limit(limit)
+    )
+
+    condition, rank = match_and_rank(Romancist.name, term, dialect)
+    romancists = await session.execute(
+        select(Romancist.id, Romancist.name, rank.label('rank'))
+        .where(condition)
+        .order_by(rank.desc(), Romancist.id)
+        .limit(limit)
+    )
+
+    return {
+        'books': books.mappings().all(),
+        'romancists': romancists.mappings().all(),
+    }
@@ -1,52 +1,89 @@
 from http import HTTPStatus
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 
-from mader.common import T_CurrentUser, T_Session
+from mader.admission import limit_auth_attempts
+from mader.budget import query_budget
+from mader.common import T_CurrentUser, T_ReadSession, T_Session
+from mader.database import dialect_insert
 from mader.models import User
-from mader.schemas import UserPublic, UserSchema, UsersList
-from mader.security import get_password_hash
+from mader.pagination import page_total, paginate
+from mader.schemas import UserPublic, UserSchema, UsersList, UsersPage
+from mader.security import get_password_hash_async, invalidate_principal
+from mader.serialization import (
+    columns_for,
+    fast_json_response,
+    rows_as_dicts,
+)
+from mader.statements import USER_EXISTS
+from mader.timing import timed
 from mader.utils import sanitize_username
 
 router = APIRouter(prefix='/users', tags=['users'])
 
 
-@router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
+@router.post(
+    '/',
+    status_code=HTTPStatus.CREATED,
+    response_model=UserPublic,
+    dependencies=[Depends(limit_auth_attempts)],
+)
+@query_budget(2)
 async def create_user(user: UserSchema, session: T_Session):
-    db_user = await session.scalar(
-        select(User).where(
-            (User.username == user.username) | (User.email == user.email)
-        )
+    conflict = HTTPException(
+        status_code=HTTPStatus.CONFLICT,
+        detail='User already exists in the MADR',
     )
+    username = sanitize_username(user.username)
+    # a duplicate signup is turned away before paying for a hash
+    if await session.scalar(
+        USER_EXISTS, {'username': username, 'email': user.email}
+    ):
+        raise conflict
+
+    # the hash can queue behind others: no connection is held meanwhile
+    await session.close()
+    password = await get_password_hash_async(user.password)
+
+    # still racing other signups, the insert has the last word
+    result = await session.execute(
+        dialect_insert(session, User)
+        .values(username=username, email=user.email, password=password)
+        .on_conflict_do_nothing()
+        .returning(User.id, User.username, User.email)
+    )
+    db_user = result.mappings().one_or_none()
 
-    if db_user:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT,
-            detail='User already exists in the MADR',
-        )
-
-    sanitized_username = sanitize_username(user.username)
+    if not db_user:
+        raise conflict
 
-    db_user = User(
-        username=sanitized_username,
-        email=user.email,
-        password=get_password_hash(user.password),
-    )
-    session.add(db_user)
     await session.commit()
-    await session.refresh(db_user)
-
     return db_user
 
 
 @router.get('/', response_model=UsersList)
-async def read_users(session: T_Session, limit: int = 100, offset: int = 0):
-    users = await session.scalars(select(User).limit(limit).offset(offset))
-    return {'users': users}
+@query_budget(3)
+async def read_users(
+    session: T_ReadSession, page: Annotated[UsersPage, Depends()]
+):
+    query = select(*columns_for(User, UserPublic))
+    users, next_cursor = await paginate(session, query, User.id, page)
+    total = await page_total(session, query, page)
+    with timed('serialize'):
+        return fast_json_response(
+            UsersList,
+            {
+                'users': rows_as_dicts(users),
+                'next_cursor': next_cursor,
+                **total,
+            },
+        )
 
 
 @router.delete('/{user_id}')
+@query_budget(2)
 async def delete_user(
     user_id: int, session: T_Session, current_user: T_CurrentUser
 ):
@@ -58,10 +95,12 @@ async def delete_user(
 
     await session.delete(current_user)
     await session.commit()
+    invalidate_principal(user_id)
     return {'message': 'User deleted'}
 
 
 @router.put('/{user_id}', response_model=UserPublic)
+@query_budget(3)
 async def update_user(
     user_id: int,
     user: UserSchema,
@@ -78,8 +117,9 @@ async def update_user(
 
     current_user.username = sanitized_username
     current_user.email = user.email
-    current_user.password = get_password_hash(user.password)
+    current_user.password = await get_password_hash_async(user.password)
     await session.commit()
+    invalidate_principal(user_id)
     await session.refresh(current_user)
 
     return current_user
@@ -1,4 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, EmailStr, Field, computed_field
 
 
 class UserSchema(BaseModel):
@@ -15,6 +18,9 @@ class UserPublic(BaseModel):
 
 class UsersList(BaseModel):
     users: list[UserPublic]
+    next_cursor: str | None = None
+    total: int | None = None
+    total_is_estimate: bool | None = None
 
 
 class TokenSchema(BaseModel):
@@ -32,7 +38,8 @@ class RomancistPublic(RomancistSchema):
 
 class BookSchema(BaseModel):
     title: str
-    year: str
+    # lax mode still takes the numeric strings the API used to expect
+    year: int
     romancist_id: int
 
 
@@ -42,10 +49,35 @@ class BookPublic(BookSchema):
 
 class BooksList(BaseModel):
     books: list[BookPublic]
+    next_cursor: str | None = None
+    total: int | None = None
+    total_is_estimate: bool | None = None
 
 
 class RomancistsList(BaseModel):
     romancists: list[RomancistPublic]
+    next_cursor: str | None = None
+    total: int | None = None
+    total_is_estimate: bool | None = None
+
+
+class RomancistWithBooks(RomancistPublic):
+    books: list[BookPublic]
+    next_cursor: str | None = None
+
+
+class RomancistDuplicates(BaseModel):
+    groups: list[list[RomancistPublic]]
+
+
+class RomancistMerge(BaseModel):
+    duplicate_ids: list[int] = Field(min_length=1)
+
+
+class RomancistMergeResult(BaseModel):
+    romancist: RomancistPublic
+    merged_ids: list[int]
+    books_moved: int
 
 
 class RomancistUpdate(BaseModel):
@@ -54,9 +86,80 @@ class RomancistUpdate(BaseModel):
 
 class BookUpdate(BaseModel):
     title: str | None = None
-    year: str | None = None
+    year: int | None = None
     romancist_id: int | None = None
 
 
 class Message(BaseModel):
     message: str
+
+
+class PageParams(BaseModel):
+    limit: int = 20
+    cursor: str | None = None
+    offset: int = 0
+    include_total: bool = False
+
+
+class UsersPage(PageParams):
+    limit: int = 100
+
+
+class BooksFilter(PageParams):
+    title: str | None = None
+    year: int | None = None
+    year_from: int | None = None
+    year_to: int | None = None
+    order_by: Literal['id', 'year'] = 'id'
+
+
+class RomancistsFilter(PageParams):
+    name: str | None = None
+
+
+class BulkConflict(BaseModel):
+    index: int
+    detail: str
+
+
+class BooksBulkResult(BaseModel):
+    books: list[BookPublic]
+    conflicts: list[BulkConflict]
+
+
+class RomancistsBulkResult(BaseModel):
+    romancists: list[RomancistPublic]
+    conflicts: list[BulkConflict]
+
+
+class BookSearchResult(BookPublic):
+    rank: float
+
+
+class RomancistSearchResult(RomancistPublic):
+    rank: float
+
+
+class SearchResults(BaseModel):
+    books: list[BookSearchResult]
+    romancists: list[RomancistSearchResult]
+
+
+class ImportJobPublic(BaseModel):
+    id: int
+    import_format: str
+    status: str
+    rows_processed: int
+    rows_rejected: int
+    elapsed_seconds: float
+    error: str | None
+    created_at: datetime
+
+    @computed_field
+    @property
+    def rows_per_second(self) -> float | None:
+        if not self.elapsed_seconds:
+            return None
+
+        rows = self.rows_processed + self.rows_rejected
+        return round(rows / self.elapsed_seconds, 1)
@@ -1,21 +1,110 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from http import HTTPStatus
+from typing import Callable
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jwt import ExpiredSignatureError, PyJWTError, decode, encode
 from pwdlib import PasswordHash
-from sqlalchemy import select
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from zoneinfo import ZoneInfo
 
-from mader.database import get_session
+from mader.cache import TTLCache
+from mader.database import get_session, pin_to_primary
 from mader.models import User
-from mader.settings import Settings
+from mader.settings import get_settings
+from mader.statements import USER_BY_EMAIL
+from mader.timing import timed
 
 pwd_context = PasswordHash.recommended()
-settings = Settings()
+settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL
+)
+# when each user was last invalidated, so a lookup that started before an
+# update or delete committed doesn't cache the row it read. Dropped by age
+# alone: a marker evicted for room would let that lookup cache the row
+principal_invalidations: OrderedDict[int, float] = OrderedDict()
+
+
+class PasswordWorkerPool:
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.shed = 0
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='password'
+        )
+
+    def _call(self, submitted_at: float, func: Callable, *args):
+        wait = time.perf_counter() - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                # fail fast rather than let a burst of logins pile up behind
+                # argon2 and starve everything else of CPU
+                self.shed += 1
+                raise HTTPException(
+                    status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                    detail='Server busy, try again later',
+                    headers={'Retry-After': str(self.retry_after)},
+                )
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        with timed('argon2'):
+            return await loop.run_in_executor(
+                self._executor, self._call, time.perf_counter(), func, *args
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.running + self.completed
+            return {
+                'workers': self.max_workers,
+                'queued': self.queued,
+                'max_queue': self.max_queue,
+                'shed': self.shed,
+                'running': self.running,
+                'completed': self.completed,
+                'wait_avg_ms': (
+                    self.total_wait / started * 1000 if started else 0.0
+                ),
+                'wait_max_ms': self.max_wait * 1000,
+            }
+
+
+password_pool = PasswordWorkerPool(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE_SIZE,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER,
+)
 
 
 def get_password_hash(password: str) -> str:
@@ -26,13 +115,62 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    return await password_pool.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(tz=ZoneInfo('UTC')) + timedelta(
         minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
     )
     to_encode.update({'exp': expire})
-    return encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    with timed('jwt'):
+        return encode(
+            to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        )
+
+
+def _snapshot_user(user: User) -> dict:
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(User).column_attrs
+    }
+
+
+def _restore_user(snapshot: dict) -> User:
+    user = User(
+        username=snapshot['username'],
+        email=snapshot['email'],
+        password=snapshot['password'],
+    )
+    user.id = snapshot['id']
+    user.created_at = snapshot['created_at']
+    user.updated_at = snapshot['updated_at']
+    make_transient_to_detached(user)
+    return user
+
+
+def invalidate_principal(user_id: int):
+    now = time.monotonic()
+    principal_invalidations[user_id] = now
+    principal_invalidations.move_to_end(user_id)
+    # no lookup is still running after a cache entry's lifetime
+    while (
+        next(iter(principal_invalidations.values()))
+        < now - settings.PRINCIPAL_CACHE_TTL
+    ):
+        principal_invalidations.popitem(last=False)
+
+    principal_cache.discard_where(lambda _, value: value['id'] == user_id)
 
 
 async def get_current_user(
@@ -43,10 +181,18 @@ async def get_current_user(
         status_code=HTTPStatus.UNAUTHORIZED,
         detail='Unauthorized',
     )
+
+    snapshot = principal_cache.get(token)
+    if snapshot is not None:
+        # the entry never outlives the token's exp, so a hit is a valid token
+        pin_to_primary(token)
+        return await session.merge(_restore_user(snapshot), load=False)
+
     try:
-        payload = decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        with timed('jwt'):
+            payload = decode(
+                token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
         email = payload.get('sub')
         if not email:
             raise credentials_exception
@@ -55,8 +201,19 @@ async def get_current_user(
     except PyJWTError:
         raise credentials_exception
 
-    user_db = await session.scalar(select(User).where(User.email == email))
+    looked_up_at = time.monotonic()
+    user_db = await session.scalar(USER_BY_EMAIL, {'email': email})
     if user_db is None:
         raise credentials_exception
 
+    if principal_invalidations.get(user_db.id, 0.0) < looked_up_at:
+        principal_cache.set(
+            token,
+            _snapshot_user(user_db),
+            ttl=payload.get('exp', 0)
+            - datetime.now(tz=ZoneInfo('UTC')).timestamp(),
+        )
+    # authenticated requests are writes: keep the caller's next reads off
+    # the replicas so they see them
+    pin_to_primary(token)
     return user_db
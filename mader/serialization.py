@@ -0,0 +1,78 @@
+from functools import cache
+from typing import Any, get_args, get_origin
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+from mader.settings import get_settings
+from mader.timing import count_rows
+
+settings = get_settings()
+
+
+def _plain(annotation):
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return typed_dict_of(annotation)
+
+    if get_origin(annotation) is list:
+        return list[_plain(get_args(annotation)[0])]
+
+    return annotation
+
+
+@cache
+def typed_dict_of(model: type[BaseModel]) -> type:
+    return TypedDict(
+        f'{model.__name__}Dict',
+        {
+            name: _plain(field.annotation)
+            for name, field in model.model_fields.items()
+        },
+    )
+
+
+@cache
+def serializer_for(model: type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(typed_dict_of(model))
+
+
+def model_json(model: type[BaseModel], data: dict[str, Any]) -> bytes:
+    # validated into the model first, as a response_model would be. Keys
+    # left out of the data, like an unrequested total, stay out
+    return (
+        model.model_validate(data).model_dump_json(exclude_unset=True).encode()
+    )
+
+
+def fast_json(model: type[BaseModel], data: dict[str, Any]) -> bytes:
+    # serializes already-shaped dicts against the model's fields: no
+    # validation and no intermediate model instances
+    return serializer_for(model).dump_json(data)
+
+
+def dump_json(model: type[BaseModel], data: dict[str, Any]) -> bytes:
+    if settings.FAST_SERIALIZATION:
+        return fast_json(model, data)
+
+    return model_json(model, data)
+
+
+def columns_for(entity, model: type[BaseModel]) -> list:
+    return [getattr(entity, name) for name in model.model_fields]
+
+
+def rows_as_dicts(rows) -> list[dict[str, Any]]:
+    count_rows(len(rows))
+    if not rows:
+        return []
+
+    # Row._asdict() looks the keys up again for every row
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def fast_json_response(
+    model: type[BaseModel], data: dict[str, Any]
+) -> Response:
+    return Response(dump_json(model, data), media_type='application/json')
@@ -1,3 +1,5 @@
+from functools import cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,3 +12,61 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL: int = 60
+
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    PASSWORD_HASH_RETRY_AFTER: int = 1
+
+    AUTH_RATE_LIMIT_PER_SECOND: float = 1.0
+    AUTH_RATE_LIMIT_BURST: int = 10
+    AUTH_RATE_LIMIT_CLIENTS: int = 10000
+    # addresses of the load balancers whose X-Forwarded-For names the
+    # client. Left empty behind one, every client shares the balancer's
+    # auth rate limit bucket
+    TRUSTED_PROXIES: list[str] = []
+
+    MAX_PAGE_SIZE: int = 100
+    EXACT_COUNT_THRESHOLD: int = 10000
+    COUNT_CACHE_SIZE: int = 256
+    COUNT_CACHE_TTL: int = 10
+
+    MAX_BULK_SIZE: int = 1000
+
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # list pages dumped from row dicts without validation, see
+    # benchmarks/serialization.py
+    FAST_SERIALIZATION: bool = False
+
+    IMPORT_BATCH_SIZE: int = 5000
+    IMPORT_MAX_BYTES: int = 2 * 1024**3
+
+    DUPLICATE_SIMILARITY: float = 0.6
+
+    RESPONSE_CACHE_SIZE: int = 1024
+    RESPONSE_CACHE_TTL: int = 30
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    DATABASE_POOL_RECYCLE: int = -1
+    DATABASE_POOL_PRE_PING: bool = False
+    DATABASE_STATEMENT_CACHE_SIZE: int = 500
+    DATABASE_PGBOUNCER: bool = False
+    DATABASE_WARMUP_CONNECTIONS: int = 2
+
+    READ_REPLICA_URLS: list[str] = []
+    READ_REPLICA_HEALTH_INTERVAL: float = 5.0
+    # whole seconds, the least libpq accepts is 2
+    READ_REPLICA_CONNECT_TIMEOUT: int = 2
+    READ_YOUR_WRITES_WINDOW: float = 5.0
+
+    SERVER_TIMING_LOG_THRESHOLD_MS: float | None = None
+
+
+@cache
+def get_settings() -> Settings:
+    return Settings()
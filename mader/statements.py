@@ -0,0 +1,80 @@
+from sqlalchemy import bindparam, delete, event, or_, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import await_only
+
+from mader.models import Book, Romancist, User
+
+# built once: statements memoize their cache key, so reusing them skips
+# the per-request cache key generation of a fresh select()
+BOOK_BY_ID = select(Book).where(Book.id == bindparam('book_id'))
+BOOK_ROW_BY_ID = select(
+    Book.id, Book.title, Book.year, Book.romancist_id
+).where(Book.id == bindparam('book_id'))
+# the ORM can't evaluate a bound where clause against the session, and
+# request sessions are thrown away afterwards anyway
+DELETE_BOOK = (
+    delete(Book)
+    .where(Book.id == bindparam('book_id'))
+    .returning(Book.id)
+    .execution_options(synchronize_session=False)
+)
+
+ROMANCIST_BY_ID = select(Romancist).where(
+    Romancist.id == bindparam('romancist_id')
+)
+ROMANCIST_ROW_BY_ID = select(Romancist.id, Romancist.name).where(
+    Romancist.id == bindparam('romancist_id')
+)
+ROMANCIST_EXISTS = select(Romancist.id).where(
+    Romancist.id == bindparam('romancist_id')
+)
+DELETE_ROMANCIST = (
+    delete(Romancist)
+    .where(Romancist.id == bindparam('romancist_id'))
+    .returning(Romancist.id)
+    .execution_options(synchronize_session=False)
+)
+
+USER_BY_EMAIL = select(User).where(User.email == bindparam('email'))
+USER_EXISTS = (
+    select(User.id)
+    .where(
+        or_(
+            User.username == bindparam('username'),
+            User.email == bindparam('email'),
+        )
+    )
+    .limit(1)
+)
+
+# statement, parameters matching nothing of the same types as real ones
+HOT_STATEMENTS = [
+    (USER_BY_EMAIL, {'email': '@'}),
+    (BOOK_BY_ID, {'book_id': 0}),
+    (ROMANCIST_BY_ID, {'romancist_id': 0}),
+    (ROMANCIST_EXISTS, {'romancist_id': 0}),
+]
+
+
+def prepare_on_connect(engine: AsyncEngine):
+    # psycopg reuses a statement already prepared on the connection for
+    # every later execution of the same SQL, instead of waiting for
+    # prepare_threshold executions
+    dialect = engine.dialect
+    compiled = [
+        (statement.compile(dialect=dialect), params)
+        for statement, params in HOT_STATEMENTS
+    ]
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def prepare(dbapi_connection, connection_record):
+        connection = dbapi_connection.driver_connection
+        for statement, params in compiled:
+            await_only(
+                connection.execute(
+                    str(statement),
+                    statement.construct_params(params),
+                    prepare=True,
+                )
+            )
+        await_only(connection.rollback())
@@ -0,0 +1,117 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+logger = logging.getLogger('mader.timing')
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.queries = 0
+        self.rows = 0
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        metrics = [
+            f'{phase};dur={seconds * 1000:.2f}'
+            for phase, seconds in self.phases.items()
+        ]
+        metrics.append(
+            f'total;dur={self.total * 1000:.2f};'
+            f'desc="queries={self.queries} rows={self.rows}"'
+        )
+        return ', '.join(metrics)
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar(
+    'current_timings', default=None
+)
+
+
+def record(phase: str, seconds: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, 'before_cursor_execute', named=True)
+def _before_cursor_execute(context, **kw):
+    context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute', named=True)
+def _after_cursor_execute(context, **kw):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add('db', time.perf_counter() - context.query_started)
+        timings.queries += 1
+
+
+def count_rows(rows: int):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.rows += rows
+
+
+@event.listens_for(Mapper, 'load')
+def _on_load(target, context):
+    count_rows(1)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app, log_threshold_ms: float | None = None):
+        self.app = app
+        self.log_threshold_ms = log_threshold_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+
+        async def send_with_timings(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = [
+                    *message.get('headers', []),
+                    (b'server-timing', timings.header().encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            current_timings.reset(token)
+            if (
+                self.log_threshold_ms is not None
+                and timings.total * 1000 >= self.log_threshold_ms
+            ):
+                logger.warning(
+                    'slow request %s %s: %s',
+                    scope['method'],
+                    scope['path'],
+                    timings.header(),
+                )
@@ -1,8 +1,13 @@
 import re
+import unicodedata
 
 
 def sanitize_username(username: str) -> str:
-    username = username.strip().lower()
+    username = (
+        unicodedata.normalize('NFKD', username.strip().lower())
+        .encode('ascii', 'ignore')
+        .decode()
+    )  # fold accents: josé -> jose, instead of dropping the letter
     cleaned_username = re.sub(
         r'[^A-Za-z0-9 ]+', '', username
     )  # remove special characters
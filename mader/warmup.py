@@ -0,0 +1,42 @@
+import logging
+from contextlib import AsyncExitStack
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from mader.models import Book, Romancist
+from mader.schemas import BookPublic, RomancistPublic
+from mader.serialization import columns_for
+from mader.statements import HOT_STATEMENTS
+
+logger = logging.getLogger('mader.warmup')
+
+
+def hot_statements() -> list:
+    # same shapes as the hot endpoints run, so they share the engine's
+    # compiled cache entries; the parameters match nothing
+    books = select(*columns_for(Book, BookPublic)).order_by(Book.id)
+    romancists = select(*columns_for(Romancist, RomancistPublic))
+    return [
+        *HOT_STATEMENTS,
+        (books.limit(1), {}),
+        (books.where(Book.romancist_id == 0).limit(1), {}),
+        (romancists.order_by(Romancist.id).limit(1), {}),
+    ]
+
+
+async def warm_up(engine: AsyncEngine, connections: int):
+    try:
+        async with AsyncExitStack() as stack:
+            for _ in range(connections):
+                connection = await stack.enter_async_context(engine.connect())
+                await connection.execute(text('SELECT 1'))
+
+        async with AsyncSession(engine) as session:
+            for statement, params in hot_statements():
+                await session.execute(statement, params)
+    except (SQLAlchemyError, OSError):
+        # requests open their own connections, so a cold pool is slower
+        # but not fatal
+        logger.warning('database warm-up failed', exc_info=True)
@@ -0,0 +1,48 @@
+"""cascade romancist deletion to books
+
+Revision ID: 16e7b713ad5b
+Revises: a4fe1e242d95
+Create Date: 2026-10-18 20:45:29.718374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '16e7b713ad5b'
+down_revision: Union[str, None] = 'a4fe1e242d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def replace_foreign_key(on_delete: str) -> None:
+    # NOT VALID + VALIDATE keeps the ACCESS EXCLUSIVE lock short: the
+    # full-table check runs under a lock that doesn't block writes, once
+    # the swap has committed and released the exclusive one
+    op.execute(
+        'ALTER TABLE books '
+        'DROP CONSTRAINT books_romancist_id_fkey, '
+        'ADD CONSTRAINT books_romancist_id_fkey '
+        'FOREIGN KEY (romancist_id) REFERENCES romancists (id) '
+        f'{on_delete} NOT VALID'
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            'ALTER TABLE books VALIDATE CONSTRAINT books_romancist_id_fkey'
+        )
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    replace_foreign_key('ON DELETE CASCADE')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    replace_foreign_key('')
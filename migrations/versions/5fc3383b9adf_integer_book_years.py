@@ -0,0 +1,145 @@
+"""integer book years
+
+Revision ID: 5fc3383b9adf
+Revises: f9e3a03dc430
+Create Date: 2026-10-18 21:28:02.668177
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5fc3383b9adf'
+down_revision: Union[str, None] = 'f9e3a03dc430'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+BATCH_SIZE = 10000
+
+
+def parse_year(column: str, dialect: str) -> str:
+    # the first run of digits of the free-text year, 0 when there's none
+    if dialect != 'postgresql':
+        return f'CAST({column} AS integer)'
+
+    return (
+        f"COALESCE(CAST(substring({column} FROM '-?[0-9]{{1,9}}') "
+        'AS integer), 0)'
+    )
+
+
+def report_unparsed_years(dialect: str) -> None:
+    if dialect == 'postgresql':
+        unclean = "year_text !~ '^\\s*-?[0-9]{1,9}\\s*$'"
+    else:
+        unclean = (
+            'CAST(CAST(year_text AS integer) AS text) != trim(year_text)'
+        )
+
+    unparsed = op.get_bind().scalar(
+        sa.text(f'SELECT count(*) FROM books WHERE {unclean}')
+    )
+    if unparsed:
+        logger.warning(
+            '%d book years were not plain numbers; their original text is '
+            'kept in books.year_text',
+            unparsed,
+        )
+
+
+# the text column stays, as year_text, until a later contract migration:
+# years that weren't plain numbers can still be fixed from it, and the
+# downgrade restores it.
+#
+# online on Postgres: expand with a nullable column kept in sync by a
+# trigger, backfill in small transactions, index concurrently, then swap
+# the columns in one short transaction
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.add_column('books', sa.Column('year_text', sa.String()))
+        op.execute('UPDATE books SET year_text = year')
+        with op.batch_alter_table('books') as batch:
+            batch.alter_column(
+                'year', type_=sa.Integer(), existing_nullable=False
+            )
+        report_unparsed_years(bind.dialect.name)
+        return
+
+    op.add_column('books', sa.Column('year_number', sa.Integer()))
+    op.execute(f"""
+        CREATE FUNCTION books_year_number() RETURNS trigger AS $$
+        BEGIN
+            NEW.year_number := {parse_year('NEW.year', 'postgresql')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        'CREATE TRIGGER books_year_number BEFORE INSERT OR UPDATE OF year '
+        'ON books FOR EACH ROW EXECUTE FUNCTION books_year_number()'
+    )
+
+    with op.get_context().autocommit_block():
+        last_id = bind.scalar(sa.text('SELECT max(id) FROM books')) or 0
+        for start in range(0, last_id, BATCH_SIZE):
+            bind.execute(
+                sa.text(
+                    f'UPDATE books SET year_number = {parse_year("year", "postgresql")} '
+                    'WHERE id > :start AND id <= :end '
+                    'AND year_number IS NULL'
+                ),
+                {'start': start, 'end': start + BATCH_SIZE},
+            )
+
+        op.create_index(
+            'ix_books_year_number',
+            'books',
+            ['year_number', 'id'],
+            postgresql_concurrently=True,
+        )
+        # a validated check lets SET NOT NULL skip its full table scan
+        op.execute(
+            'ALTER TABLE books ADD CONSTRAINT books_year_number_not_null '
+            'CHECK (year_number IS NOT NULL) NOT VALID'
+        )
+        op.execute(
+            'ALTER TABLE books VALIDATE CONSTRAINT books_year_number_not_null'
+        )
+
+    op.execute('DROP TRIGGER books_year_number ON books')
+    op.execute('DROP FUNCTION books_year_number()')
+    op.drop_index('ix_books_year', table_name='books')
+    op.alter_column(
+        'books', 'year', new_column_name='year_text', nullable=True
+    )
+    op.alter_column('books', 'year_number', new_column_name='year')
+    op.execute('ALTER INDEX ix_books_year_number RENAME TO ix_books_year')
+    op.alter_column('books', 'year', nullable=False)
+    op.drop_constraint('books_year_number_not_null', 'books')
+    report_unparsed_years(bind.dialect.name)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    with op.batch_alter_table('books') as batch:
+        batch.alter_column(
+            'year',
+            type_=sa.String(),
+            existing_nullable=False,
+            postgresql_using='year::varchar',
+        )
+    # the original text, unless the year was changed after the upgrade
+    op.execute(
+        'UPDATE books SET year = year_text '
+        f"WHERE year = CAST({parse_year('year_text', dialect)} AS varchar)"
+    )
+    with op.batch_alter_table('books') as batch:
+        batch.drop_column('year_text')
@@ -0,0 +1,40 @@
+"""import jobs owned by users
+
+Revision ID: 898d94bf9235
+Revises: 5fc3383b9adf
+Create Date: 2026-10-19 10:12:41.530217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '898d94bf9235'
+down_revision: Union[str, None] = '5fc3383b9adf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# nullable: the jobs already there have no owner to backfill, they stay
+# in the table but no user can read them
+def upgrade() -> None:
+    with op.batch_alter_table('import_jobs') as batch:
+        batch.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch.create_foreign_key(
+            'import_jobs_user_id_fkey',
+            'users',
+            ['user_id'],
+            ['id'],
+            ondelete='CASCADE',
+        )
+        batch.create_index('ix_import_jobs_user_id', ['user_id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('import_jobs') as batch:
+        batch.drop_index('ix_import_jobs_user_id')
+        batch.drop_constraint('import_jobs_user_id_fkey', type_='foreignkey')
+        batch.drop_column('user_id')
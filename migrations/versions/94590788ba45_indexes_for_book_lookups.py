@@ -0,0 +1,42 @@
+"""indexes for book lookups
+
+Revision ID: 94590788ba45
+Revises: 16e7b713ad5b
+Create Date: 2026-10-18 20:46:14.335016
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '94590788ba45'
+down_revision: Union[str, None] = '16e7b713ad5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# the trailing id lets keyset pages (WHERE col = :x AND id > :last
+# ORDER BY id) be read straight from the index. books.title and
+# romancists.name are already covered by their unique indexes.
+INDEXES = [
+    ('ix_books_year', ['year', 'id']),
+    ('ix_books_romancist_id', ['romancist_id', 'id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(
+                name, 'books', columns, postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.drop_index(
+                name, table_name='books', postgresql_concurrently=True
+            )
@@ -0,0 +1,50 @@
+"""unique titles and romancist names
+
+Revision ID: a4fe1e242d95
+Revises: e26725c8f1e7
+Create Date: 2026-10-18 20:42:19.900336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4fe1e242d95'
+down_revision: Union[str, None] = 'e26725c8f1e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # titles and names are stored sanitized, so these also catch variants
+    # that only differ in case or punctuation. Existing duplicates must be
+    # merged first or the build fails (and leaves an INVALID index behind).
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_books_title',
+            'books',
+            ['title'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_romancists_name',
+            'romancists',
+            ['name'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_romancists_name',
+            table_name='romancists',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_books_title', table_name='books', postgresql_concurrently=True
+        )
@@ -0,0 +1,47 @@
+"""search indexes for books and romancists
+
+Revision ID: e26725c8f1e7
+Revises: 5e1158121326
+Create Date: 2026-10-18 20:35:45.641134
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e26725c8f1e7'
+down_revision: Union[str, None] = '5e1158121326'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_INDEXES = [
+    ('ix_books_title_trgm', 'books', 'title gin_trgm_ops'),
+    ('ix_books_title_tsv', 'books', "to_tsvector('simple', title)"),
+    ('ix_romancists_name_trgm', 'romancists', 'name gin_trgm_ops'),
+    ('ix_romancists_name_tsv', 'romancists', "to_tsvector('simple', name)"),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table, expression in SEARCH_INDEXES:
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                f'ON {table} USING gin ({expression})'
+            )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        for name, _, _ in SEARCH_INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
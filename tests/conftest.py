@@ -1,13 +1,40 @@
 import factory
+import httpx
 import pytest_asyncio
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from testcontainers.postgres import PostgresContainer
 
-from mader.app import app
-from mader.database import get_session
+from mader.admission import auth_buckets
+from mader.app import create_app
+from mader.budget import QueryCounter, route_budget
+from mader.cache import response_cache
+from mader.database import get_read_session, get_session, primary_pins
 from mader.models import Book, Romancist, User, table_registry
-from mader.security import get_password_hash
+from mader.pagination import count_cache
+from mader.security import (
+    get_password_hash,
+    principal_cache,
+    principal_invalidations,
+)
+
+
+class BudgetedClient(TestClient):
+    def __init__(self, app, engine):
+        super().__init__(app)
+        self.engine = engine
+
+    def request(self, method, url, **kwargs):
+        budget = route_budget(self.app, method.upper(), httpx.URL(url).path)
+        with QueryCounter(self.engine) as counter:
+            response = super().request(method, url, **kwargs)
+
+        assert budget is None or counter.count <= budget, (
+            f'{method} {url} ran {counter.count} statements '
+            f'(budget {budget}): {counter.statements}'
+        )
+        return response
 
 
 class UserFactory(factory.Factory):
@@ -31,7 +58,7 @@ class BookFactory(factory.Factory):
         model = Book
 
     title = factory.Sequence(lambda n: f'book{n}')
-    year = factory.Sequence(lambda n: f'{n}')
+    year = factory.Sequence(lambda n: n)
     romancist_id = 1
 
 
@@ -56,15 +83,23 @@ async def session(engine):
 
 
 @pytest_asyncio.fixture
-async def client(session):
+async def client(session, engine):
     async def get_test_session():
         return session
 
-    with TestClient(app) as client:
-        app.dependency_overrides[get_session] = get_test_session
-        yield client
+    principal_cache.clear()
+    principal_invalidations.clear()
+    response_cache.clear()
+    count_cache.clear()
+    primary_pins.clear()
+    auth_buckets.clear()
 
-    app.dependency_overrides.clear()
+    app = create_app(engine)
+    app.dependency_overrides[get_session] = get_test_session
+    app.dependency_overrides[get_read_session] = get_test_session
+
+    with BudgetedClient(app, engine) as client:
+        yield client
 
 
 @pytest_asyncio.fixture
@@ -116,9 +151,30 @@ async def romancist(session):
 @pytest_asyncio.fixture
 async def book(session, romancist):
     book_db = Book(
-        title='pride and prejudice', year='1813', romancist_id=romancist.id
+        title='pride and prejudice', year=1813, romancist_id=romancist.id
     )
     session.add(book_db)
     await session.commit()
     await session.refresh(book_db)
     return book_db
+
+
+@pytest_asyncio.fixture
+async def explain(session):
+    dialect = session.bind.dialect
+
+    async def explain_query(query):
+        sql = query.compile(
+            dialect=dialect, compile_kwargs={'literal_binds': True}
+        )
+        if dialect.name == 'sqlite':
+            plan = await session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))
+            return '\n'.join(row.detail for row in plan)
+
+        # tiny test tables would otherwise always be sequentially scanned
+        await session.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = await session.scalars(text(f'EXPLAIN {sql}'))
+        await session.rollback()
+        return '\n'.join(plan)
+
+    return explain_query
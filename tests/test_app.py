@@ -1,7 +1,62 @@
+import asyncio
+import time
 from http import HTTPStatus
 
+from fastapi.testclient import TestClient
+
+from mader.app import create_app
+from mader.cache import response_cache
+from mader.database import build_engine
+from mader.models import table_registry
+from mader.settings import Settings
+
 
 def test_read_root(client):
     response = client.get('/')
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'message': 'Hello World!'}
+
+
+def test_read_metrics(client):
+    response = client.get('/metrics')
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['principal_cache'] == {
+        'size': 0,
+        'maxsize': 1024,
+        'hits': 0,
+        'misses': 0,
+    }
+    assert response.json()['password_pool']['queued'] == 0
+
+
+def test_cold_start_warms_the_pool(tmp_path, record_property):
+    settings = Settings(DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/db')
+    engine = build_engine(settings)
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(table_registry.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(create_tables())
+    response_cache.clear()
+
+    started = time.perf_counter()
+    with TestClient(create_app(engine)) as client:
+        startup = time.perf_counter() - started
+        warm_connections = engine.pool.checkedin()
+
+        started = time.perf_counter()
+        response = client.get('/books/')
+        first_request = time.perf_counter() - started
+        connections_after_request = engine.pool.checkedin()
+
+    record_property('cold_start_ms', round(startup * 1000, 2))
+    record_property('first_request_ms', round(first_request * 1000, 2))
+
+    assert response.status_code == HTTPStatus.OK
+    assert warm_connections == settings.DATABASE_WARMUP_CONNECTIONS
+    assert connections_after_request == warm_connections
+    # the engine was passed in: shutting the app down leaves it alone
+    assert engine.pool.checkedin() == warm_connections
+    asyncio.run(engine.dispose())
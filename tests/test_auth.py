@@ -1,6 +1,10 @@
 from http import HTTPStatus
 
 import freezegun
+from fastapi.testclient import TestClient
+
+from mader.admission import TokenBuckets, auth_buckets, settings
+from mader.app import create_app
 
 
 def test_auth(client, user):
@@ -62,3 +66,58 @@ def test_refresh_token_expired_token(client, user):
 
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json()['detail'] == 'Unauthorized'
+
+
+def test_auth_attempts_are_rate_limited_per_client(client, user, monkeypatch):
+    # argon2 is slow enough for the bucket to refill between attempts
+    monkeypatch.setattr(auth_buckets, 'rate', 0.01)
+    for _ in range(settings.AUTH_RATE_LIMIT_BURST):
+        response = client.post(
+            '/auth/token',
+            data={'username': user.email, 'password': 'incorrect_password'},
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    response = client.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response.headers['retry-after']) >= 1
+
+
+def test_auth_rate_limit_keys_on_the_forwarded_client(
+    client, user, monkeypatch
+):
+    monkeypatch.setattr(auth_buckets, 'rate', 0.01)
+    monkeypatch.setattr(auth_buckets, 'burst', 1)
+    monkeypatch.setattr(settings, 'TRUSTED_PROXIES', ['testclient'])
+    app = create_app(client.app.state.engine)
+    app.dependency_overrides = client.app.dependency_overrides
+    proxied = TestClient(app)
+
+    def attempt(forwarded_for):
+        return proxied.post(
+            '/auth/token',
+            data={'username': user.email, 'password': 'incorrect_password'},
+            headers={'X-Forwarded-For': forwarded_for},
+        ).status_code
+
+    assert attempt('203.0.113.1') == HTTPStatus.BAD_REQUEST
+    assert attempt('203.0.113.1') == HTTPStatus.TOO_MANY_REQUESTS
+    assert attempt('203.0.113.2') == HTTPStatus.BAD_REQUEST
+
+
+def test_token_buckets_refill_over_time(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('mader.admission.time.monotonic', lambda: clock[0])
+    buckets = TokenBuckets(rate=2, burst=1, maxsize=10)
+    next_token_in = 0.5
+
+    assert buckets.take('client') == 0
+    assert buckets.take('client') == next_token_in
+    assert buckets.take('other') == 0
+
+    clock[0] += next_token_in
+    assert buckets.take('client') == 0
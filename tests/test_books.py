@@ -1,14 +1,20 @@
+import json
 from http import HTTPStatus
 
 import pytest
+from sqlalchemy import select, text
 
+from mader.budget import QueryCounter
+from mader.models import Book
+from mader.pagination import count_total, encode_cursor, settings
+from mader.routers import books
 from tests.conftest import BookFactory
 
 
 def test_create_book(client, romancist, token):
     book = {
         'title': 'Pride and Prejudice',
-        'year': '1813',
+        'year': 1813,
         'romancist_id': romancist.id,
     }
     response = client.post(
@@ -21,15 +27,33 @@ def test_create_book(client, romancist, token):
     assert response.json() == {
         'id': 1,
         'title': 'pride and prejudice',
-        'year': '1813',
+        'year': 1813,
         'romancist_id': romancist.id,
     }
 
 
+def test_create_book_accepts_year_as_string(client, romancist, token):
+    expected_year = 1813
+    response = client.post(
+        '/books/',
+        json={'title': 'Emma', 'year': '1813', 'romancist_id': romancist.id},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    invalid = client.post(
+        '/books/',
+        json={'title': 'Emma', 'year': 'c. 1813', 'romancist_id': 1},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['year'] == expected_year
+    assert invalid.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
 def test_create_book_unexistent_romancist(client, token):
     book = {
         'title': 'Pride and Prejudice',
-        'year': '1813',
+        'year': 1813,
         'romancist_id': 1,
     }
     response = client.post(
@@ -47,7 +71,7 @@ def test_create_book_conflict(client, book, token):
         '/books/',
         json={
             'title': book.title,
-            'year': '1813',
+            'year': 1813,
             'romancist_id': book.romancist_id,
         },
         headers={'Authorization': f'Bearer {token}'},
@@ -57,6 +81,79 @@ def test_create_book_conflict(client, book, token):
     assert response.json() == {'detail': 'Book already exists in the MADR'}
 
 
+def test_create_books_bulk(client, book, token):
+    response = client.post(
+        '/books/bulk',
+        json=[
+            {'title': 'Emma', 'year': 1815, 'romancist_id': 1},
+            {'title': book.title, 'year': 1813, 'romancist_id': 1},
+            {'title': 'Persuasion', 'year': 1817, 'romancist_id': 2},
+            {'title': 'EMMA!', 'year': 1815, 'romancist_id': 1},
+            {'title': 'Mansfield Park', 'year': 1814, 'romancist_id': 1},
+        ],
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json() == {
+        'books': [
+            {'id': 2, 'title': 'emma', 'year': 1815, 'romancist_id': 1},
+            {
+                'id': 3,
+                'title': 'mansfield park',
+                'year': 1814,
+                'romancist_id': 1,
+            },
+        ],
+        'conflicts': [
+            {'index': 1, 'detail': 'Book already exists in the MADR'},
+            {'index': 2, 'detail': 'Romancist not found'},
+            {'index': 3, 'detail': 'Book already exists in the MADR'},
+        ],
+    }
+
+
+def test_create_books_bulk_romancist_deleted_meanwhile(
+    client, romancist, token, monkeypatch
+):
+    existing_romancists = books.existing_romancists
+    lookups = []
+
+    async def stale_lookup(session, romancist_ids):
+        found = await existing_romancists(session, romancist_ids)
+        lookups.append(found)
+        # romancist 2 was there for the first lookup, deleted before the
+        # insert
+        return found | {2} if len(lookups) == 1 else found
+
+    monkeypatch.setattr(books, 'existing_romancists', stale_lookup)
+    response = client.post(
+        '/books/bulk',
+        json=[
+            {'title': 'Emma', 'year': 1815, 'romancist_id': romancist.id},
+            {'title': 'Persuasion', 'year': 1817, 'romancist_id': 2},
+        ],
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert [book['title'] for book in response.json()['books']] == ['emma']
+    assert response.json()['conflicts'] == [
+        {'index': 1, 'detail': 'Romancist not found'}
+    ]
+
+
+def test_create_books_bulk_too_large(client, token):
+    books = [{'title': 'book', 'year': 1900, 'romancist_id': 1}] * 1001
+    response = client.post(
+        '/books/bulk',
+        json=books,
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
 def test_delete_book(client, book, token):
     response = client.delete(
         f'/books/{book.id}', headers={'Authorization': f'Bearer {token}'}
@@ -75,6 +172,45 @@ def test_delete_book_not_found(client, token):
     assert response.json() == {'detail': 'Book not found'}
 
 
+def test_export_books_ndjson(client, book):
+    response = client.get('/books/export')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {
+            'title': 'pride and prejudice',
+            'year': 1813,
+            'romancist_id': book.romancist_id,
+            'id': book.id,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_books_csv(client, session, romancist):
+    expected_rows = 2501
+    session.add_all(
+        Book(title=f'title{n}', year=1900, romancist_id=romancist.id)
+        for n in range(2500)
+    )
+    await session.commit()
+
+    response = client.get('/books/export?export_format=csv')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/csv')
+    lines = response.text.splitlines()
+    assert len(lines) == expected_rows
+    assert lines[:2] == ['title,year,romancist_id,id', 'title0,1900,1,1']
+
+
+def test_export_books_invalid_format(client):
+    response = client.get('/books/export?export_format=xml')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
 def test_read_book(client, book):
     response = client.get(f'/books/{book.id}')
 
@@ -82,11 +218,36 @@ def test_read_book(client, book):
     assert response.json() == {
         'id': book.id,
         'title': 'pride and prejudice',
-        'year': '1813',
+        'year': 1813,
         'romancist_id': book.romancist_id,
     }
 
 
+def test_read_book_not_modified(client, book):
+    etag = client.get(f'/books/{book.id}').headers['etag']
+
+    response = client.get(f'/books/{book.id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert not response.content
+
+
+def test_read_book_etag_changes_after_update(client, book, token):
+    etag = client.get(f'/books/{book.id}').headers['etag']
+    client.patch(
+        f'/books/{book.id}',
+        json={'title': 'new title'},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    response = client.get(f'/books/{book.id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'] != etag
+    assert response.json()['title'] == 'new title'
+
+
 def test_read_book_not_found(client):
     response = client.get('/books/1')
 
@@ -103,18 +264,27 @@ def test_read_books_with_book(client, book):
             {
                 'id': book.id,
                 'title': 'pride and prejudice',
-                'year': '1813',
+                'year': 1813,
                 'romancist_id': book.romancist_id,
             }
-        ]
+        ],
+        'next_cursor': None,
     }
 
 
+def test_read_books_not_modified(client, book):
+    etag = client.get('/books/').headers['etag']
+
+    response = client.get('/books/', headers={'If-None-Match': f'W/{etag}'})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
 def test_read_books_with_no_books(client):
     response = client.get('/books/')
 
     assert response.status_code == HTTPStatus.OK
-    assert response.json() == {'books': []}
+    assert response.json() == {'books': [], 'next_cursor': None}
 
 
 @pytest.mark.asyncio
@@ -127,14 +297,15 @@ async def test_read_books_with_title(client, session, romancist):
     assert response.status_code == HTTPStatus.OK
     assert len(response.json()['books']) == 1
     assert response.json() == {
-        'books': [{'id': 1, 'title': 'book0', 'year': '0', 'romancist_id': 1}]
+        'books': [{'id': 1, 'title': 'book0', 'year': 0, 'romancist_id': 1}],
+        'next_cursor': None,
     }
 
 
 @pytest.mark.asyncio
 async def test_read_books_with_year(client, session, romancist):
     expected_books = 5
-    session.add_all(BookFactory.build_batch(5, year='1900'))
+    session.add_all(BookFactory.build_batch(5, year=1900))
     await session.commit()
 
     response = client.get('/books/?year=1900')
@@ -143,10 +314,65 @@ async def test_read_books_with_year(client, session, romancist):
     assert len(response.json()['books']) == expected_books
 
 
+@pytest.mark.asyncio
+async def test_read_books_with_year_range(client, session, romancist):
+    session.add_all(
+        Book(title=f'title{year}', year=year, romancist_id=romancist.id)
+        for year in (1790, 1800, 1825, 1850, 1851)
+    )
+    await session.commit()
+
+    response = client.get('/books/?year_from=1800&year_to=1850')
+
+    assert response.status_code == HTTPStatus.OK
+    assert [book['year'] for book in response.json()['books']] == [
+        1800,
+        1825,
+        1850,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_read_books_ordered_by_year(client, session, romancist):
+    years = [1900, 850, 1900, 1850, 2000, 999]
+    session.add_all(
+        Book(title=f'title{n}', year=year, romancist_id=romancist.id)
+        for n, year in enumerate(years)
+    )
+    await session.commit()
+
+    pages, cursor = [], None
+    while True:
+        params = {'order_by': 'year', 'limit': 2, 'year_from': 900}
+        if cursor:
+            params['cursor'] = cursor
+        page = client.get('/books/', params=params).json()
+        pages.append([(book['year'], book['id']) for book in page['books']])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert pages == [
+        [(999, 6), (1850, 4)],
+        [(1900, 1), (1900, 3)],
+        [(2000, 5)],
+    ]
+
+
+def test_read_books_cursor_must_match_order(client):
+    response = client.get(
+        '/books/',
+        params={'order_by': 'year', 'cursor': encode_cursor(1)},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
 @pytest.mark.asyncio
 async def test_read_books_with_title_and_year(client, session, romancist):
     expected_books = 1
-    session.add_all(BookFactory.build_batch(5, year='1900'))
+    session.add_all(BookFactory.build_batch(5, year=1900))
     await session.commit()
 
     response = client.get('/books/?title=book10&year=1900')
@@ -160,7 +386,7 @@ async def test_read_books_with_title_and_year_should_return_0(
     client, session, romancist
 ):
     expected_books = 0
-    session.add_all(BookFactory.build_batch(5, year='1900'))
+    session.add_all(BookFactory.build_batch(5, year=1900))
     await session.commit()
 
     response = client.get('/books/?title=book10&year=1901')
@@ -204,6 +430,108 @@ async def test_read_books_with_limit_and_offset_and_title(
     assert len(response.json()['books']) == expected_books
 
 
+@pytest.mark.asyncio
+async def test_read_books_with_cursor(client, session, romancist):
+    expected_books = 5
+    session.add_all(BookFactory.build_batch(25))
+    await session.commit()
+
+    first_page = client.get('/books/').json()
+    response = client.get(
+        '/books/', params={'cursor': first_page['next_cursor']}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['books']) == expected_books
+    assert (
+        response.json()['books'][0]['id'] == first_page['books'][-1]['id'] + 1
+    )
+    assert response.json()['next_cursor'] is None
+
+
+def test_read_books_with_invalid_cursor(client):
+    response = client.get('/books/?cursor=invalid')
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+@pytest.mark.asyncio
+async def test_read_books_with_total(client, session, romancist):
+    expected_total, expected_filtered = 25, 5
+    session.add_all(BookFactory.build_batch(20, year=1900))
+    session.add_all(BookFactory.build_batch(5, year=1901))
+    await session.commit()
+
+    response = client.get('/books/?include_total=true')
+    filtered = client.get('/books/?year=1901&include_total=true')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['total'] == expected_total
+    assert response.json()['total_is_estimate'] is False
+    assert filtered.json()['total'] == expected_filtered
+    assert 'total' not in client.get('/books/').json()
+
+
+@pytest.mark.asyncio
+async def test_read_books_total_is_counted_once_per_filter(
+    client, session, engine, romancist
+):
+    expected_total = 25
+    session.add_all(BookFactory.build_batch(25))
+    await session.commit()
+
+    first_page = client.get('/books/?include_total=true').json()
+    with QueryCounter(engine) as counter:
+        response = client.get(
+            '/books/',
+            params={
+                'include_total': True,
+                'cursor': first_page['next_cursor'],
+            },
+        )
+
+    assert response.json()['total'] == expected_total
+    assert counter.count == 1
+
+
+@pytest.mark.asyncio
+async def test_large_tables_use_planner_estimates(
+    session, romancist, monkeypatch
+):
+    if session.bind.dialect.name != 'postgresql':
+        pytest.skip('planner statistics are Postgres only')
+
+    threshold = 2
+    monkeypatch.setattr(settings, 'EXACT_COUNT_THRESHOLD', threshold)
+    session.add_all(BookFactory.build_batch(5, year=1900))
+    await session.commit()
+    await session.execute(text('ANALYZE books'))
+    query = select(Book.id)
+
+    year = 1900
+    broad = await count_total(session, query.where(Book.year == year))
+    narrow = await count_total(session, query.where(Book.year == 1))
+
+    assert await count_total(session, query) == (5, True)
+    assert broad[0] > threshold
+    assert broad[1] is True
+    assert narrow == (0, False)
+
+
+@pytest.mark.asyncio
+async def test_read_books_limit_is_capped(client, session, romancist):
+    max_page_size = 100
+    session.add_all(BookFactory.build_batch(105))
+    await session.commit()
+
+    response = client.get('/books/?limit=1000')
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['books']) == max_page_size
+    assert response.json()['next_cursor']
+
+
 def test_update_book(client, book, token):
     response = client.patch(
         f'/books/{book.id}',
@@ -220,6 +548,32 @@ def test_update_book(client, book, token):
     }
 
 
+@pytest.mark.asyncio
+async def test_update_book_conflict(client, session, book, token):
+    session.add(Book(title='emma', year=1815, romancist_id=book.romancist_id))
+    await session.commit()
+
+    response = client.patch(
+        f'/books/{book.id}',
+        json={'title': 'emma'},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {'detail': 'Book already exists in the MADR'}
+
+
+def test_update_book_unexistent_romancist(client, book, token):
+    response = client.patch(
+        f'/books/{book.id}',
+        json={'romancist_id': 999},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Romancist not found'}
+
+
 def test_update_book_not_found(client, token):
     response = client.patch(
         '/books/1',
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import select, text
+
+from mader.app import app
+from mader.budget import QueryCounter, route_budget
+from mader.models import Book
+
+
+def test_every_endpoint_declares_a_query_budget():
+    missing = [
+        route.path
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        and not hasattr(route.endpoint, 'query_budget')
+    ]
+
+    assert missing == []
+
+
+def test_route_budget():
+    expected_budget = 2
+
+    assert route_budget(app, 'GET', '/romancists/1') == expected_budget
+    assert route_budget(app, 'GET', '/books/export') == 1
+    assert route_budget(app, 'GET', '/unknown') is None
+
+
+@pytest.mark.asyncio
+async def test_query_counter(engine, session):
+    expected_statements = 2
+
+    with QueryCounter(engine) as counter:
+        await session.execute(text('SELECT 1'))
+        await session.scalars(select(Book))
+    await session.execute(text('SELECT 1'))
+
+    assert counter.count == expected_statements
+    assert counter.statements[0] == 'SELECT 1'
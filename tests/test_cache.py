@@ -0,0 +1,103 @@
+import pytest
+from fastapi import Request
+
+from mader.cache import (
+    cached_response,
+    invalidate_responses,
+    response_cache,
+    response_invalidated_at,
+    settings,
+)
+
+
+def books_request() -> Request:
+    return Request({
+        'type': 'http',
+        'path': '/books/',
+        'query_string': b'',
+        'headers': [],
+    })
+
+
+@pytest.mark.asyncio
+async def test_render_racing_a_write_is_not_cached():
+    async def stale_render():
+        # the write commits and invalidates while this read is in flight
+        invalidate_responses('books')
+        return b'{"title":"old"}'
+
+    async def fresh_render():
+        return b'{"title":"new"}'
+
+    try:
+        raced = await cached_response(books_request(), 'books', stale_render)
+        response = await cached_response(
+            books_request(), 'books', fresh_render
+        )
+    finally:
+        response_cache.clear()
+
+    assert raced.body == b'{"title":"old"}'
+    assert response.body == b'{"title":"new"}'
+
+
+@pytest.mark.asyncio
+async def test_render_without_a_write_is_cached():
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return b'{}'
+
+    try:
+        await cached_response(books_request(), 'books', render)
+        await cached_response(books_request(), 'books', render)
+    finally:
+        response_cache.clear()
+
+    assert len(renders) == 1
+
+
+@pytest.mark.asyncio
+async def test_replica_render_right_after_a_write_is_not_cached():
+    request = books_request()
+    request.state.read_from_replica = True
+    renders, expected_renders = [], 2
+
+    async def render():
+        renders.append(1)
+        return b'{}'
+
+    invalidate_responses('books')
+    try:
+        await cached_response(request, 'books', render)
+        await cached_response(request, 'books', render)
+    finally:
+        response_cache.clear()
+
+    assert len(renders) == expected_renders
+
+
+@pytest.mark.asyncio
+async def test_replica_render_after_the_lag_window_is_cached(monkeypatch):
+    request = books_request()
+    request.state.read_from_replica = True
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return b'{}'
+
+    invalidate_responses('books')
+    monkeypatch.setitem(
+        response_invalidated_at,
+        'books',
+        response_invalidated_at['books'] - settings.READ_YOUR_WRITES_WINDOW,
+    )
+    try:
+        await cached_response(request, 'books', render)
+        await cached_response(request, 'books', render)
+    finally:
+        response_cache.clear()
+
+    assert len(renders) == 1
@@ -0,0 +1,53 @@
+import random
+import string
+
+from mader.dedup import DuplicateIndex, duplicate_groups, jaccard, shingles
+
+THRESHOLD = 0.6
+
+
+def test_shingles_ignore_accents_case_and_token_order():
+    assert shingles('José SARAMAGO') == shingles('saramago, jose')
+
+
+def test_similar_names_are_verified_pairs():
+    index = DuplicateIndex(THRESHOLD)
+    index.add(1, 'jos saramago')
+    index.add(2, 'jose saramago')
+    index.add(3, 'machado de assis')
+
+    assert list(index.pairs()) == [(1, 2)]
+    assert jaccard(shingles('jos saramago'), shingles('jose saramago')) > (
+        THRESHOLD
+    )
+
+
+def test_duplicate_groups_are_transitive():
+    groups = duplicate_groups(
+        [
+            (4, 'clarice lispector'),
+            (1, 'jose saramago'),
+            (2, 'jose saramag'),
+            (3, 'jose saramagos'),
+            (5, 'machado de assis'),
+        ],
+        THRESHOLD,
+    )
+
+    assert groups == [[1, 2, 3]]
+
+
+def test_unrelated_names_are_rarely_compared():
+    names = random.Random(0)
+    index = DuplicateIndex(THRESHOLD)
+    for key in range(2000):
+        index.add(
+            key,
+            ' '.join(
+                ''.join(names.choices(string.ascii_lowercase, k=6))
+                for _ in range(2)
+            ),
+        )
+
+    all_pairs = 2000 * 1999 // 2
+    assert len(index.candidates()) < all_pairs // 1000
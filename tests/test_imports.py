@@ -0,0 +1,191 @@
+import json
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import select
+
+from mader.imports import normalize_batch, receive_upload, settings
+from mader.models import Book, Romancist
+from mader.routers import imports
+from mader.security import create_access_token
+
+
+def ndjson(*records) -> str:
+    return ''.join(
+        record if isinstance(record, str) else json.dumps(record) + '\n'
+        for record in records
+    )
+
+
+def test_import_ndjson_catalog(client, token):
+    expected_processed, expected_rejected = 3, 3
+    catalog = ndjson(
+        {'romancist': 'Jane Austen!', 'title': 'Emma', 'year': '1815'},
+        {'romancist': 'jane austen', 'title': 'Persuasion', 'year': 1817},
+        {'romancist': 'Jane Austen', 'title': 'Emma', 'year': ' 1816'},
+        {'romancist': 'Jane Austen', 'title': '???', 'year': '1811'},
+        {'romancist': 'Jane Austen', 'title': 'Sanditon', 'year': 'n/a'},
+        'not json\n',
+    )
+
+    response = client.post(
+        '/imports/',
+        content=catalog,
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert response.json()['status'] == 'pending'
+
+    job = client.get(
+        f'/imports/{response.json()["id"]}',
+        headers={'Authorization': f'Bearer {token}'},
+    ).json()
+    books = client.get('/books/').json()['books']
+
+    assert job['status'] == 'done'
+    assert job['rows_processed'] == expected_processed
+    assert job['rows_rejected'] == expected_rejected
+    assert job['rows_per_second'] > 0
+    assert [(book['title'], book['year']) for book in books] == [
+        ('emma', 1816),
+        ('persuasion', 1817),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_csv_catalog_in_batches(
+    client, session, token, monkeypatch
+):
+    expected_books = 5
+    monkeypatch.setattr(settings, 'IMPORT_BATCH_SIZE', 2)
+    catalog = 'romancist,title,year\r\n' + ''.join(
+        f'machado de assis,book{n},{1880 + n}\r\n' for n in range(5)
+    )
+
+    response = client.post(
+        '/imports/?import_format=csv',
+        content=catalog,
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    job = client.get(
+        f'/imports/{response.json()["id"]}',
+        headers={'Authorization': f'Bearer {token}'},
+    ).json()
+
+    assert job['status'] == 'done'
+    assert job['rows_processed'] == expected_books
+    assert job['rows_rejected'] == 0
+    assert await session.scalar(select(Romancist.name)) == 'machado de assis'
+    assert len((await session.scalars(select(Book))).all()) == expected_books
+
+
+def test_import_releases_the_connection_while_uploading(
+    client, session, token, monkeypatch
+):
+    in_transaction = []
+
+    async def upload(request):
+        in_transaction.append(session.in_transaction())
+        return await receive_upload(request)
+
+    monkeypatch.setattr(imports, 'receive_upload', upload)
+    response = client.post(
+        '/imports/',
+        content=ndjson({'romancist': 'A', 'title': 'B', 'year': 1900}),
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert in_transaction == [False]
+
+
+def test_import_failure_is_recorded(client, token):
+    response = client.post(
+        '/imports/',
+        content=b'\xff\xfe not utf-8',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    job = client.get(
+        f'/imports/{response.json()["id"]}',
+        headers={'Authorization': f'Bearer {token}'},
+    ).json()
+
+    assert job['status'] == 'failed'
+    assert 'utf-8' in job['error']
+    assert job['rows_processed'] == 0
+
+
+def test_import_larger_than_the_limit_is_refused(client, token, monkeypatch):
+    monkeypatch.setattr(settings, 'IMPORT_MAX_BYTES', 10)
+    catalog = ndjson({'romancist': 'A', 'title': 'B', 'year': 1900})
+
+    declared = client.post(
+        '/imports/',
+        content=catalog,
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    # chunked, without a Content-Length to check up front
+    streamed = client.post(
+        '/imports/',
+        content=iter([catalog[:5].encode(), catalog[5:].encode()]),
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert declared.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert streamed.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert streamed.json() == {'detail': 'Imports are limited to 10 bytes'}
+
+
+def test_read_import_of_another_user(client, token, other_user):
+    response = client.post(
+        '/imports/',
+        content=ndjson({'romancist': 'A', 'title': 'B', 'year': 1900}),
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    other_token = create_access_token({'sub': other_user.email})
+
+    job = client.get(
+        f'/imports/{response.json()["id"]}',
+        headers={'Authorization': f'Bearer {other_token}'},
+    )
+
+    assert job.status_code == HTTPStatus.NOT_FOUND
+    assert job.json() == {'detail': 'Import not found'}
+
+
+def test_import_requires_authentication(client):
+    response = client.post('/imports/', content='')
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_read_import_not_found(client, token):
+    response = client.get(
+        '/imports/1', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Import not found'}
+
+
+def test_normalize_batch_rejects_incomplete_records():
+    rows, rejected = normalize_batch([
+        {'romancist': 'A', 'title': 'B', 'year': 1900},
+        {'romancist': 'A', 'title': 'B'},
+        {'romancist': None, 'title': 'B', 'year': 1900},
+        {'romancist': 'A', 'title': 'B', 'year': 99999999999},
+        {'romancist': 'A', 'title': 'B', 'year': str(-(2**31) - 1)},
+        ['A', 'B', '1900'],
+        None,
+    ])
+
+    assert rows == [('a', 'b', 1900)]
+    assert rejected == len([
+        'missing',
+        'null',
+        'too large',
+        'too small',
+        'list',
+        'invalid',
+    ])
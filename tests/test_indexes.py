@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import select
+
+from mader.models import Book, Romancist
+
+
+@pytest.mark.asyncio
+async def test_book_title_lookup_uses_index(explain):
+    plan = await explain(select(Book).where(Book.title == 'emma'))
+
+    assert 'ix_books_title' in plan
+
+
+@pytest.mark.asyncio
+async def test_book_year_filter_uses_index(explain):
+    last_id, year = 10, 1815
+    plan = await explain(
+        select(Book)
+        .where(Book.year == year, Book.id > last_id)
+        .order_by(Book.id)
+        .limit(21)
+    )
+
+    assert 'ix_books_year' in plan
+
+
+@pytest.mark.asyncio
+async def test_book_year_range_in_year_order_uses_index(explain):
+    year_from, year_to = 1800, 1850
+    plan = await explain(
+        select(Book)
+        .where(Book.year >= year_from, Book.year <= year_to)
+        .order_by(Book.year, Book.id)
+        .limit(21)
+    )
+
+    assert 'ix_books_year' in plan
+
+
+@pytest.mark.asyncio
+async def test_books_by_romancist_uses_index(explain):
+    plan = await explain(select(Book.id).where(Book.romancist_id == 1))
+
+    assert 'ix_books_romancist_id' in plan
+
+
+@pytest.mark.asyncio
+async def test_romancist_name_lookup_uses_index(explain):
+    plan = await explain(select(Romancist).where(Romancist.name == 'emma'))
+
+    assert 'ix_romancists_name' in plan
+
+
+@pytest.mark.asyncio
+async def test_title_substring_filter_uses_trigram_index(session, explain):
+    if session.bind.dialect.name != 'postgresql':
+        pytest.skip('trigram indexes are Postgres only')
+
+    plan = await explain(select(Book).where(Book.title.contains('emm')))
+
+    assert 'ix_books_title_trgm' in plan
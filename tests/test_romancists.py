@@ -1,7 +1,10 @@
 from http import HTTPStatus
 
 import pytest
+from sqlalchemy import func, select
 
+from mader.budget import QueryCounter
+from mader.models import Book, Romancist
 from tests.conftest import RomancistFactory
 
 
@@ -38,6 +41,64 @@ def test_create_romancist_conflict(client, romancist, token):
     }
 
 
+def test_create_romancist_folds_accents(client, token):
+    response = client.post(
+        '/romancists/',
+        json={'name': 'José Saramago'},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    duplicate = client.post(
+        '/romancists/',
+        json={'name': 'Jose Saramago'},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.json()['name'] == 'jose saramago'
+    assert duplicate.status_code == HTTPStatus.CONFLICT
+
+
+def test_create_romancists_bulk(client, romancist, token):
+    response = client.post(
+        '/romancists/bulk',
+        json=[
+            {'name': 'Machado de Assis'},
+            {'name': 'Jane Austen'},
+            {'name': 'machado  de assis'},
+            {'name': 'Clarice Lispector'},
+        ],
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json() == {
+        'romancists': [
+            {'id': 2, 'name': 'machado de assis'},
+            {'id': 3, 'name': 'clarice lispector'},
+        ],
+        'conflicts': [
+            {'index': 1, 'detail': 'Romancist already exists in the MADR'},
+            {'index': 2, 'detail': 'Romancist already exists in the MADR'},
+        ],
+    }
+
+
+def test_create_romancists_bulk_unauthorized(client):
+    response = client.post('/romancists/bulk', json=[{'name': 'Jane'}])
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.json() == {'detail': 'Not authenticated'}
+
+
+def test_export_romancists(client, romancist):
+    response = client.get('/romancists/export')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-disposition'] == (
+        'attachment; filename="romancists.ndjson"'
+    )
+    assert response.text == '{"name": "jane austen", "id": 1}\n'
+
+
 def test_read_romancist(client, romancist):
     response = client.get(f'/romancists/{romancist.id}')
 
@@ -45,6 +106,93 @@ def test_read_romancist(client, romancist):
     assert response.json() == {'id': 1, 'name': 'jane austen'}
 
 
+def test_read_romancist_not_modified(client, romancist):
+    etag = client.get(f'/romancists/{romancist.id}').headers['etag']
+
+    response = client.get(
+        f'/romancists/{romancist.id}', headers={'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_read_romancists_cache_invalidated_on_delete(client, romancist, token):
+    client.get('/romancists/')
+    client.delete(
+        f'/romancists/{romancist.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    response = client.get('/romancists/')
+
+    assert response.json() == {'romancists': [], 'next_cursor': None}
+
+
+def test_read_romancist_with_books(client, book):
+    response = client.get(f'/romancists/{book.romancist_id}?include=books')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'id': book.romancist_id,
+        'name': 'jane austen',
+        'books': [
+            {
+                'id': book.id,
+                'title': 'pride and prejudice',
+                'year': 1813,
+                'romancist_id': book.romancist_id,
+            }
+        ],
+        'next_cursor': None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_read_romancist_with_books_uses_two_statements(
+    client, engine, session, romancist
+):
+    expected_books, expected_statements = 20, 2
+    session.add_all(
+        Book(title=f'title{n}', year=1900, romancist_id=romancist.id)
+        for n in range(30)
+    )
+    await session.commit()
+
+    with QueryCounter(engine) as counter:
+        response = client.get(f'/romancists/{romancist.id}?include=books')
+
+    assert len(response.json()['books']) == expected_books
+    assert response.json()['next_cursor']
+    assert counter.count == expected_statements
+
+
+@pytest.mark.asyncio
+async def test_read_romancist_books(client, session, romancist):
+    expected_books = 5
+    session.add_all(
+        Book(title=f'title{n}', year=1900, romancist_id=romancist.id)
+        for n in range(25)
+    )
+    await session.commit()
+
+    first_page = client.get(f'/romancists/{romancist.id}/books').json()
+    response = client.get(
+        f'/romancists/{romancist.id}/books',
+        params={'cursor': first_page['next_cursor']},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['books']) == expected_books
+    assert response.json()['next_cursor'] is None
+
+
+def test_read_romancist_books_not_found(client):
+    response = client.get('/romancists/1/books')
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Romancist not found'}
+
+
 def test_read_romancist_not_found(client):
     response = client.get('/romancists/1')
 
@@ -57,7 +205,8 @@ def test_read_romancists_with_romancist(client, romancist):
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {
-        'romancists': [{'id': 1, 'name': 'jane austen'}]
+        'romancists': [{'id': 1, 'name': 'jane austen'}],
+        'next_cursor': None,
     }
 
 
@@ -65,7 +214,7 @@ def test_read_romancists_with_no_romancists(client):
     response = client.get('/romancists/')
 
     assert response.status_code == HTTPStatus.OK
-    assert response.json() == {'romancists': []}
+    assert response.json() == {'romancists': [], 'next_cursor': None}
 
 
 @pytest.mark.asyncio
@@ -104,6 +253,103 @@ async def test_read_romancists_with_name_should_return_0(client, session):
     assert len(response.json()['romancists']) == expected_romancists
 
 
+@pytest.mark.asyncio
+async def test_read_romancists_with_cursor(client, session):
+    expected_romancists = 2
+    session.add_all(RomancistFactory.build_batch(5))
+    await session.commit()
+
+    first_page = client.get('/romancists/?limit=3').json()
+    response = client.get(
+        '/romancists/',
+        params={'limit': 3, 'cursor': first_page['next_cursor']},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['romancists']) == expected_romancists
+    assert response.json()['next_cursor'] is None
+
+
+@pytest.mark.asyncio
+async def test_read_romancist_duplicates(client, session):
+    session.add_all([
+        Romancist(name='jos saramago'),
+        Romancist(name='clarice lispector'),
+        Romancist(name='saramago jose'),
+        Romancist(name='machado de assis'),
+        Romancist(name='clarice lispektor'),
+    ])
+    await session.commit()
+
+    response = client.get('/romancists/duplicates')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'groups': [
+            [
+                {'id': 1, 'name': 'jos saramago'},
+                {'id': 3, 'name': 'saramago jose'},
+            ],
+            [
+                {'id': 2, 'name': 'clarice lispector'},
+                {'id': 5, 'name': 'clarice lispektor'},
+            ],
+        ]
+    }
+
+
+@pytest.mark.asyncio
+async def test_merge_romancists(client, session, token):
+    expected_books = 3
+    session.add_all([
+        Romancist(name='jose saramago'),
+        Romancist(name='jos saramago'),
+        Romancist(name='saramago jose'),
+    ])
+    await session.flush()
+    session.add_all([
+        Book(title='ensaio sobre a cegueira', year=1995, romancist_id=1),
+        Book(title='memorial do convento', year=1982, romancist_id=2),
+        Book(title='o evangelho', year=1991, romancist_id=3),
+    ])
+    await session.commit()
+
+    response = client.post(
+        '/romancists/1/merge',
+        json={'duplicate_ids': [2, 3, 1, 99]},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    books = client.get('/romancists/1/books').json()['books']
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'romancist': {'id': 1, 'name': 'jose saramago'},
+        'merged_ids': [2, 3],
+        'books_moved': 2,
+    }
+    assert len(books) == expected_books
+    assert client.get('/romancists/2').status_code == HTTPStatus.NOT_FOUND
+
+
+def test_merge_romancists_not_found(client, token):
+    response = client.post(
+        '/romancists/1/merge',
+        json={'duplicate_ids': [2]},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Romancist not found'}
+
+
+def test_merge_romancists_unauthorized(client, romancist):
+    response = client.post(
+        f'/romancists/{romancist.id}/merge', json={'duplicate_ids': [2]}
+    )
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
 def test_delete_romancist(client, romancist, token):
     response = client.delete(
         f'/romancists/{romancist.id}',
@@ -114,6 +360,43 @@ def test_delete_romancist(client, romancist, token):
     assert response.json() == {'message': 'Romancist deleted from the MADR'}
 
 
+def test_delete_romancist_with_books(client, book, token):
+    response = client.delete(
+        f'/romancists/{book.romancist_id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert client.get(f'/books/{book.id}').status_code == (
+        HTTPStatus.NOT_FOUND
+    )
+
+
+@pytest.mark.asyncio
+async def test_delete_romancist_is_a_single_statement(
+    client, engine, session, romancist, token
+):
+    session.add_all(
+        Book(title=f'title{n}', year=1900, romancist_id=romancist.id)
+        for n in range(50)
+    )
+    await session.commit()
+    client.post(
+        '/auth/refresh_token', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    with QueryCounter(engine) as counter:
+        response = client.delete(
+            f'/romancists/{romancist.id}',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert counter.count == 1
+    assert counter.statements[0].startswith('DELETE FROM romancists')
+    assert await session.scalar(select(func.count()).select_from(Book)) == 0
+
+
 def test_delete_romancist_not_found(client, token):
     response = client.delete(
         '/romancists/1', headers={'Authorization': f'Bearer {token}'}
@@ -142,6 +425,23 @@ def test_update_romancist(client, romancist, token):
     assert response.json() == {'id': 1, 'name': 'clarice lispector'}
 
 
+@pytest.mark.asyncio
+async def test_update_romancist_conflict(client, session, romancist, token):
+    session.add(Romancist(name='clarice lispector'))
+    await session.commit()
+
+    response = client.patch(
+        f'/romancists/{romancist.id}',
+        json={'name': 'Clarice Lispector'},
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {
+        'detail': 'Romancist already exists in the MADR'
+    }
+
+
 def test_update_romancist_not_found(client, token):
     updated_romancist = {'name': 'Clarice Lispector'}
     response = client.patch(
@@ -0,0 +1,49 @@
+from http import HTTPStatus
+
+import pytest
+
+from mader.models import Book
+
+
+@pytest.mark.asyncio
+async def test_search_books_by_title(client, session, romancist):
+    session.add_all([
+        Book(title='emma and more', year=1816, romancist_id=romancist.id),
+        Book(title='emma', year=1815, romancist_id=romancist.id),
+        Book(title='persuasion', year=1817, romancist_id=romancist.id),
+    ])
+    await session.commit()
+
+    response = client.get('/search/?q=Emma')
+
+    assert response.status_code == HTTPStatus.OK
+    assert [book['title'] for book in response.json()['books']] == [
+        'emma',
+        'emma and more',
+    ]
+    assert (
+        response.json()['books'][0]['rank']
+        >= (response.json()['books'][1]['rank'])
+    )
+    assert response.json()['romancists'] == []
+
+
+def test_search_romancists_by_name(client, book, romancist):
+    response = client.get('/search/?q=austen')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['books'] == []
+    assert [r['id'] for r in response.json()['romancists']] == [romancist.id]
+
+
+def test_search_with_only_special_characters(client):
+    response = client.get('/search/?q=%25%25')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'books': [], 'romancists': []}
+
+
+def test_search_without_query(client):
+    response = client.get('/search/')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
@@ -1,6 +1,23 @@
+import asyncio
+import threading
 from http import HTTPStatus
 
-from mader.security import create_access_token
+import pytest
+from fastapi import HTTPException
+
+from mader.database import primary_pins
+from mader.security import (
+    PasswordWorkerPool,
+    create_access_token,
+    get_current_user,
+    get_password_hash_async,
+    invalidate_principal,
+    password_pool,
+    principal_cache,
+    principal_invalidations,
+    settings,
+    verify_password_async,
+)
 
 
 def test_valid_token_with_unexistent_user(client, user):
@@ -31,3 +48,129 @@ def test_no_sub_token(client, user):
 
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json() == {'detail': 'Unauthorized'}
+
+
+def test_current_user_is_cached(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert principal_cache.stats()['misses'] == 1
+    assert principal_cache.stats()['hits'] == 1
+
+
+def test_cached_principal_invalidated_on_update(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'test2',
+            'email': 'test2@mail.com',
+            'password': 'password2',
+        },
+        headers=headers,
+    )
+
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.json() == {'detail': 'Unauthorized'}
+
+
+def test_cached_principal_invalidated_on_delete(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.delete(f'/users/{user.id}', headers=headers)
+
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.json() == {'detail': 'Unauthorized'}
+
+
+@pytest.mark.asyncio
+async def test_principal_lookup_racing_an_invalidation_is_not_cached(
+    session, user, monkeypatch
+):
+    token = create_access_token({'sub': user.email})
+    lookup = session.scalar
+
+    async def racing_lookup(statement, params):
+        found = await lookup(statement, params)
+        # the user is updated and invalidated while this read is in flight,
+        # along with more users than the principal cache holds
+        invalidate_principal(user.id)
+        for other_id in range(settings.PRINCIPAL_CACHE_SIZE + 1):
+            invalidate_principal(user.id + 1 + other_id)
+        return found
+
+    monkeypatch.setattr(session, 'scalar', racing_lookup)
+    try:
+        current_user = await get_current_user(session, token)
+        cached = principal_cache.get(token)
+    finally:
+        principal_cache.clear()
+        principal_invalidations.clear()
+        primary_pins.clear()
+
+    assert current_user.id == user.id
+    assert cached is None
+
+
+def test_principal_invalidations_expire_with_the_cache(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('mader.security.time.monotonic', lambda: clock[0])
+    try:
+        invalidate_principal(1)
+        clock[0] += settings.PRINCIPAL_CACHE_TTL + 1
+        invalidate_principal(2)
+
+        assert list(principal_invalidations) == [2]
+    finally:
+        principal_invalidations.clear()
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_on_worker_pool():
+    completed = password_pool.stats()['completed']
+
+    hashed = await get_password_hash_async('password')
+
+    assert await verify_password_async('password', hashed)
+    assert not await verify_password_async('wrong', hashed)
+    assert password_pool.stats()['completed'] == completed + 3
+    assert password_pool.stats()['queued'] == 0
+
+
+@pytest.mark.asyncio
+async def test_password_pool_sheds_load_when_the_queue_is_full():
+    pool = PasswordWorkerPool(max_workers=1, max_queue=1, retry_after=2)
+    release = threading.Event()
+
+    running = asyncio.create_task(pool.run(release.wait))
+    while not pool.running:
+        await asyncio.sleep(0.01)
+    queued = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as error:
+        await pool.run(release.wait)
+
+    release.set()
+    await asyncio.gather(running, queued)
+
+    assert error.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert error.value.headers == {'Retry-After': '2'}
+    assert pool.stats()['shed'] == 1
+
+
+def test_authenticated_requests_pin_reads_to_primary(client, token):
+    client.post(
+        '/auth/refresh_token', headers={'Authorization': 'Bearer invalid'}
+    )
+    assert primary_pins.get('invalid') is None
+
+    client.post(
+        '/auth/refresh_token', headers={'Authorization': f'Bearer {token}'}
+    )
+    assert primary_pins.get(token)
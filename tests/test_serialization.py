@@ -0,0 +1,59 @@
+import pytest
+
+from mader.app import app
+from mader.models import Book
+from mader.schemas import BookPublic, BooksList, RomancistWithBooks
+from mader.serialization import (
+    fast_json,
+    model_json,
+    serializer_for,
+    settings,
+    typed_dict_of,
+)
+
+
+def test_fast_json_matches_pydantic_output():
+    books = [
+        {'title': f'title{n}', 'year': 1900, 'romancist_id': 1, 'id': n}
+        for n in range(3)
+    ]
+    page = {'books': books, 'next_cursor': 'Wzld'}
+
+    # keys left out of the page, like an unrequested total, stay out
+    assert fast_json(BooksList, page) == model_json(BooksList, page)
+
+
+def test_typed_dict_of_nested_models():
+    fields = typed_dict_of(RomancistWithBooks).__annotations__
+
+    assert fields['books'] == list[typed_dict_of(BookPublic)]
+    assert fields['id'] is int
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('fast', [False, True])
+async def test_list_pages_serialize_the_same_on_both_paths(
+    client, session, romancist, monkeypatch, fast
+):
+    session.add(Book(title='title', year=1900, romancist_id=romancist.id))
+    await session.commit()
+    serializer_for.cache_clear()
+    monkeypatch.setattr(settings, 'FAST_SERIALIZATION', fast)
+
+    response = client.get('/books/')
+
+    assert response.json()['books'] == [
+        {'title': 'title', 'year': 1900, 'romancist_id': romancist.id, 'id': 1}
+    ]
+    # the default path never builds the fast serializer
+    assert (serializer_for.cache_info().currsize > 0) is fast
+
+
+def test_fast_path_keeps_openapi_schema(client):
+    schema = client.get('/openapi.json').json()
+    response = schema['paths']['/books/']['get']['responses']['200']
+
+    assert response['content']['application/json']['schema'] == {
+        '$ref': '#/components/schemas/BooksList'
+    }
+    assert app.openapi()['components']['schemas']['UsersList']
@@ -0,0 +1,57 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from mader.timing import RequestTimings, ServerTimingMiddleware
+
+
+def test_server_timing_header(client):
+    response = client.get('/')
+
+    assert response.headers['server-timing'].startswith('total;dur=')
+    assert 'queries=0 rows=0' in response.headers['server-timing']
+
+
+def test_server_timing_breaks_down_reads(client, session, book):
+    session.expunge_all()
+    response = client.get('/books/')
+    server_timing = response.headers['server-timing']
+
+    assert 'db;dur=' in server_timing
+    assert 'serialize;dur=' in server_timing
+    assert 'rows=1' in server_timing
+
+
+def test_server_timing_breaks_down_login(client, user):
+    response = client.post(
+        '/auth/token',
+        data={'username': user.email, 'password': user.clean_password},
+    )
+    server_timing = response.headers['server-timing']
+
+    assert 'argon2;dur=' in server_timing
+    assert 'jwt;dur=' in server_timing
+    assert 'queries=1' in server_timing
+
+
+def test_request_timings_accumulate_phases():
+    timings = RequestTimings()
+    timings.add('db', 0.001)
+    timings.add('db', 0.002)
+
+    assert timings.header().startswith('db;dur=3.00, total;dur=')
+
+
+def test_slow_requests_are_logged(caplog):
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware, log_threshold_ms=0)
+
+    @app.get('/')
+    async def read_root():
+        return {}
+
+    with caplog.at_level(logging.WARNING, logger='mader.timing'):
+        TestClient(app).get('/')
+
+    assert 'slow request GET /: total;dur=' in caplog.text
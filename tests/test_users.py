@@ -1,5 +1,7 @@
 from http import HTTPStatus
 
+from mader.routers import users
+
 
 def test_create_user(client):
     response = client.post(
@@ -53,6 +55,47 @@ def test_create_user_with_existing_username(client, user):
     }
 
 
+def test_create_user_conflict_skips_the_password_hash(
+    client, user, monkeypatch
+):
+    hashed = []
+
+    async def get_password_hash_async(password):
+        hashed.append(password)
+        return password
+
+    monkeypatch.setattr(
+        users, 'get_password_hash_async', get_password_hash_async
+    )
+    response = client.post(
+        '/users/',
+        json={
+            'username': 'other',
+            'email': user.email,
+            'password': 'password',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert hashed == []
+
+
+def test_create_user_with_existing_sanitized_username(client, user):
+    response = client.post(
+        '/users/',
+        json={
+            'username': f'  {user.username.upper()}!!',
+            'email': 'test2@mail.com',
+            'password': 'password',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert response.json() == {
+        'detail': 'User already exists in the MADR',
+    }
+
+
 def test_create_user_with_existing_email(client, user):
     response = client.post(
         '/users/',
@@ -72,7 +115,7 @@ def test_create_user_with_existing_email(client, user):
 def test_get_users_with_no_users(client):
     response = client.get('/users/')
     assert response.status_code == HTTPStatus.OK
-    assert response.json() == {'users': []}
+    assert response.json() == {'users': [], 'next_cursor': None}
 
 
 def test_get_users_with_user(client, user):
@@ -86,6 +129,36 @@ def test_get_users_with_user(client, user):
                 'email': user.email,
             },
         ],
+        'next_cursor': None,
+    }
+
+
+def test_get_users_with_total(client, user, other_user):
+    expected_total = 2
+    response = client.get('/users/?limit=1&include_total=true')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['total'] == expected_total
+    assert response.json()['total_is_estimate'] is False
+
+
+def test_get_users_with_cursor(client, user, other_user):
+    first_page = client.get('/users/?limit=1').json()
+    response = client.get(
+        '/users/', params={'limit': 1, 'cursor': first_page['next_cursor']}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert first_page['users'][0]['id'] == user.id
+    assert response.json() == {
+        'users': [
+            {
+                'id': other_user.id,
+                'username': other_user.username,
+                'email': other_user.email,
+            },
+        ],
+        'next_cursor': None,
     }
 
 